@@ -1,13 +1,11 @@
 from favourites import get_user_favorites, add_favorite, remove_favorite
 from recommender import get_recommendations
-import listings as listings_module
 from configs import (
     LLM_API_KEY,
     SYNTHETIC_LISTING_CSV_PATH,
     CLEANED_LISTING_CSV_PATH,
     MERGED_LISTING_CSV_PATH,
 )
-import pandas as pd
 import pathlib
 
 from user_crud import (
@@ -289,26 +287,7 @@ def listings_menu_for_user(user, listings, users):
                     "Synthetic listings generated and merged successfully! You can now view them along with real listings."
                 )
 
-                df_merged_path = MERGED_LISTING_CSV_PATH
-
-                df = pd.read_csv(df_merged_path)
-
-                listings = [
-                    listings_module.Listing(
-                        name=row["name"],
-                        location=row["location"],
-                        property_type=row["property_type"],
-                        accommodates=row["accommodates"],
-                        amenities=row["amenities"],
-                        price=row["price"],
-                        min_nights=row["min_nights"],
-                        max_nights=row["max_nights"],
-                        review_rating=row["review_rating"],
-                        tags=row["tags"],
-                        listing_id=i,
-                    )
-                    for i, (_, row) in enumerate(df.iterrows())
-                ]
+                listings = load_listings(MERGED_LISTING_CSV_PATH)
 
             except Exception as e:
                 print("Error generating synthetic listings:", e)
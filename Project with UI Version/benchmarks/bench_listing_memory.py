@@ -0,0 +1,136 @@
+# bench_listing_memory.py
+"""
+Bytes-per-listing benchmark for the in-memory catalog.
+
+Compares three ways of holding N listings:
+  legacy   - the old Listing class (per-instance __dict__, every row owns its
+             own copy of location / property_type / amenities)
+  records  - slotted Listing objects built from a ListingStore (strings are
+             shared through the store's dictionary encoding)
+  store    - the columnar ListingStore itself (what web workers keep resident)
+
+Run from the project folder:
+    python benchmarks/bench_listing_memory.py
+    python benchmarks/bench_listing_memory.py --sizes 10000 100000 --legacy-max 100000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from listing_store import ListingStore  # noqa: E402
+from listings import Listing  # noqa: E402
+
+LOCATIONS = [
+    "princess-rosethorn", "brookhaven-amesbury", "waterfront communities-the island",
+    "annex", "niagara", "kensington-chinatown", "high park-swansea", "the beaches",
+    "church-yonge corridor", "south parkdale", "mimico", "willowdale east",
+]
+PROPERTY_TYPES = [
+    "entire home", "entire condo", "entire rental unit", "private room in home",
+    "entire guest suite", "entire townhouse",
+]
+AMENITY_POOL = [
+    "wifi", "kitchen", "free parking on premises", "washer", "dryer", "tv", "heating",
+    "air conditioning", "dedicated workspace", "hair dryer", "iron", "hot water",
+    "coffee maker", "microwave", "refrigerator", "dishwasher", "smoke alarm",
+    "carbon monoxide alarm", "fire extinguisher", "first aid kit", "bed linens",
+    "extra pillows and blankets", "self check-in", "keypad", "lake view", "beach access",
+    "pool", "hot tub", "bbq grill", "patio or balcony", "backyard", "ev charger",
+    "gym", "elevator", "long term stays allowed", "pets allowed", "crib", "high chair",
+    "board games", "books and reading material", "shampoo", "conditioner", "body soap",
+    "hangers", "essentials", "cooking basics", "dishes and silverware", "toaster",
+]
+TAGS = ["lake", "beach", "city", "cozy", "modern", "quiet", "downtown", "family", "luxury"]
+
+
+def make_frame(n, seed=7):
+    """A synthetic catalog with the same shape and repetition as the real one."""
+    rng = random.Random(seed)
+    amenity_sets = [", ".join(rng.sample(AMENITY_POOL, rng.randint(20, 45))) for _ in range(500)]
+    tag_sets = [", ".join(rng.sample(TAGS, 3)) for _ in range(60)]
+    return pd.DataFrame({
+        "listing_id": range(n),
+        "name": [f"cozy stay #{i}" for i in range(n)],
+        "location": [rng.choice(LOCATIONS) for _ in range(n)],
+        "property_type": [rng.choice(PROPERTY_TYPES) for _ in range(n)],
+        "accommodates": [rng.randint(1, 10) for _ in range(n)],
+        "amenities": [rng.choice(amenity_sets) for _ in range(n)],
+        "price": [round(rng.uniform(40, 900), 2) for _ in range(n)],
+        "min_nights": [rng.randint(1, 30) for _ in range(n)],
+        "max_nights": [rng.choice([30, 90, 365, 1125]) for _ in range(n)],
+        "review_rating": [round(rng.uniform(3, 5), 2) for _ in range(n)],
+        "tags": [rng.choice(tag_sets) for _ in range(n)],
+    })
+
+
+class LegacyListing:
+    """The pre-slots Listing: attributes live in a per-instance __dict__."""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def _copy(value):
+    # pd.read_csv hands every cell its own str object; mimic that.
+    return (value + ".")[:-1] if isinstance(value, str) else value
+
+
+def build_legacy(df):
+    return [
+        LegacyListing(**{k: _copy(v) for k, v in row.items()})
+        for row in df.to_dict(orient="records")
+    ]
+
+
+def build_records(store):
+    return store.records(range(store.size))
+
+
+def measure(build, *args):
+    """Bytes still allocated by build(*args) once it returns."""
+    gc.collect()
+    tracemalloc.start()
+    result = build(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=100_000,
+                        help="skip the legacy layout above this many rows (it needs ~2 KB per row)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} | {'legacy B/row':>13} | {'records B/row':>13} | {'store B/row':>11}")
+    print("-" * 58)
+    for n in args.sizes:
+        df = make_frame(n)
+
+        legacy = "skipped"
+        if n <= args.legacy_max:
+            used, objs = measure(build_legacy, df)
+            legacy = f"{used / n:,.0f}"
+            del objs
+
+        used, store = measure(ListingStore.from_frame, df, Listing)
+        store_bytes = f"{used / n:,.0f}"
+        del df
+
+        used, objs = measure(build_records, store)
+        records_bytes = f"{used / n:,.0f}"
+        del objs, store
+
+        print(f"{n:>10,} | {legacy:>13} | {records_bytes:>13} | {store_bytes:>11}")
+
+
+if __name__ == "__main__":
+    main()
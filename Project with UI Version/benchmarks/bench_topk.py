@@ -0,0 +1,79 @@
+# bench_topk.py
+"""
+Top-k selection benchmark for the recommender's final step.
+
+Compares three ways of picking the best k of N scored candidates, ordered by
+score then rating (both descending), ties in candidate order:
+  sort_values - the old path: full DataFrame sort on [score, review_rating], then head(k)
+  lexsort     - full NumPy lexsort of both keys, then the first k
+  top_k       - recommender.top_k: partition to the k-th best score, sort only those
+
+Scores are rounded like real ones (many ties), so the tie-breaking is exercised
+and every method is checked to return the same positions.
+
+Run from the project folder:
+    python benchmarks/bench_topk.py
+    python benchmarks/bench_topk.py --sizes 100000 1000000 --k 5 12 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from recommender import top_k  # noqa: E402
+
+
+def make_candidates(n, seed=7):
+    """Scores and ratings shaped like get_recommendations' (price proximity + environment + rating)."""
+    rng = np.random.default_rng(seed)
+    rating = rng.uniform(3, 5, n).round(2)
+    score = (rng.random(n) * 40).round(1) + (rng.random(n) < 0.2) * 30.0 + rating / 5.0 * 30.0
+    return score, rating
+
+
+def by_sort_values(score, rating, k):
+    df = pd.DataFrame({"score": score, "review_rating": rating})
+    return df.sort_values(by=["score", "review_rating"], ascending=[False, False]).head(k).index.to_numpy()
+
+
+def by_lexsort(score, rating, k):
+    return np.lexsort((-rating, -score))[:k]
+
+
+def timed(select, score, rating, k, repeat):
+    """Best wall time of repeat runs, and the positions chosen."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chosen = select(score, rating, k)
+        best = min(best, time.perf_counter() - start)
+    return best, chosen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 12])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    print(f"{'candidates':>10} | {'k':>3} | {'sort_values ms':>14} | {'lexsort ms':>10} | {'top_k ms':>8} | {'speedup':>7}")
+    print("-" * 71)
+    for n in args.sizes:
+        score, rating = make_candidates(n)
+        for k in args.k:
+            full, expected = timed(by_sort_values, score, rating, k, args.repeat)
+            lex, lexsorted = timed(by_lexsort, score, rating, k, args.repeat)
+            partial, chosen = timed(top_k, score, rating, k, args.repeat)
+            if not (np.array_equal(expected, lexsorted) and np.array_equal(expected, chosen)):
+                raise SystemExit(f"selections differ for n={n}, k={k}")
+            print(f"{n:>10,} | {k:>3} | {full * 1e3:>14.2f} | {lex * 1e3:>10.2f} | {partial * 1e3:>8.2f} | {full / partial:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# catalog_stats.py
+"""
+Per-column statistics of a listing store, kept up to date as listings change.
+
+Numeric columns keep count, missing, sum, min, max, distinct values and a
+fixed-edge histogram; text columns keep a row count per dictionary code;
+list columns (amenities, tags) keep a row count per item. Everything is
+computed once over the live rows and then adjusted with the rows that are
+appended or tombstoned, so /api/stats, the synthetic generator and the query
+planner read them without scanning the catalog.
+"""
+from collections import Counter
+
+import numpy as np
+
+from listing_index import split_amenities
+
+STATS_NUMERIC_COLUMNS = ("price", "review_rating", "accommodates", "min_nights", "max_nights")
+STATS_TEXT_COLUMNS = ("location", "property_type")
+STATS_LIST_COLUMNS = ("amenities", "tags")
+HISTOGRAM_BINS = 10
+# Price facet buckets: [0, 50), [50, 100), ... and an open-ended last bucket
+PRICE_BUCKETS = (0, 50, 100, 150, 200, 300, 500, 1000)
+
+
+class NumericStats:
+    """Count / min / max / mean / distinct / histogram of one numeric column (NaN is missing)."""
+
+    def __init__(self, values, bins=HISTOGRAM_BINS):
+        values = np.asarray(values, dtype=np.float64)
+        present = values[~np.isnan(values)]
+        self.count = 0
+        self.missing = 0
+        self.total = 0.0
+        self.counts = {}
+        self.min = self.max = None
+        # Edges are fixed at build time; later values outside them land in the end bins
+        self.edges = np.histogram_bin_edges(present, bins) if len(present) else np.empty(0)
+        self.histogram = np.zeros(max(len(self.edges) - 1, 0), dtype=np.int64)
+        self.update(values, +1)
+
+    def update(self, values, sign):
+        """Add (sign=+1) or remove (sign=-1) the given values."""
+        values = np.asarray(values, dtype=np.float64)
+        present = values[~np.isnan(values)]
+        self.missing += sign * (len(values) - len(present))
+        if not len(present):
+            return
+        self.count += sign * len(present)
+        self.total += sign * float(present.sum())
+        uniques, counts = np.unique(present, return_counts=True)
+        for value, count in zip(uniques.tolist(), counts.tolist()):
+            left = self.counts.get(value, 0) + sign * count
+            if left > 0:
+                self.counts[value] = left
+            else:
+                self.counts.pop(value, None)
+        if len(self.histogram):
+            bins = np.clip(np.searchsorted(self.edges, present, side="right") - 1, 0, len(self.histogram) - 1)
+            self.histogram += sign * np.bincount(bins, minlength=len(self.histogram))
+        if sign > 0:
+            low, high = float(uniques[0]), float(uniques[-1])
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+        elif self.min not in self.counts or self.max not in self.counts:
+            # An extreme value went away; the next one is among the distinct values
+            self.min = min(self.counts, default=None)
+            self.max = max(self.counts, default=None)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def estimate_range(self, low=None, high=None):
+        """Approximate number of values in [low, high], interpolating inside the boundary bins."""
+        if not self.count:
+            return 0
+        if (low is not None and low > self.max) or (high is not None and high < self.min):
+            return 0
+        if len(self.histogram) == 0 or self.edges[-1] == self.edges[0]:
+            return self.count
+        lo = self.edges[0] if low is None else max(low, self.edges[0])
+        hi = self.edges[-1] if high is None else min(high, self.edges[-1])
+        left, right = self.edges[:-1], self.edges[1:]
+        overlap = np.clip((np.minimum(right, hi) - np.maximum(left, lo)) / (right - left), 0.0, 1.0)
+        return int(round(float((overlap * self.histogram).sum())))
+
+    def to_dict(self):
+        return {
+            "count": int(self.count),
+            "missing": int(self.missing),
+            "min": self.min,
+            "max": self.max,
+            "mean": None if self.mean is None else round(self.mean, 4),
+            "distinct": len(self.counts),
+            "histogram": {"edges": [round(e, 4) for e in self.edges.tolist()], "counts": self.histogram.tolist()},
+        }
+
+
+class CategoryStats:
+    """Row count per dictionary code of a text column (code -1 is missing)."""
+
+    def __init__(self, codes, values):
+        self.values = values
+        self.counts = np.zeros(len(values), dtype=np.int64)
+        self.missing = 0
+        self.update(codes, values, +1)
+
+    def update(self, codes, values, sign):
+        self.values = values
+        if len(values) > len(self.counts):
+            self.counts = np.append(self.counts, np.zeros(len(values) - len(self.counts), dtype=np.int64))
+        present = codes[codes >= 0]
+        self.missing += sign * (len(codes) - len(present))
+        self.counts += sign * np.bincount(present, minlength=len(self.counts))
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    @property
+    def distinct(self):
+        return int(np.count_nonzero(self.counts))
+
+    def items(self):
+        """(value, rows) for every value still in use."""
+        present = np.flatnonzero(self.counts > 0)
+        values = np.asarray(self.values, dtype=object)[present]
+        return list(zip(values.tolist(), self.counts[present].tolist()))
+
+    def top(self, k=10):
+        return sorted(self.items(), key=lambda item: (-item[1], str(item[0])))[:k]
+
+    def to_dict(self, k=10):
+        return {"count": self.count, "missing": int(self.missing), "distinct": self.distinct, "top": self.top(k)}
+
+
+class ListStats(CategoryStats):
+    """Row count per item of a comma-separated column (amenities, tags)."""
+
+    def __init__(self, codes, values):
+        self.items_of = []  # code -> items of that distinct string, split once
+        self.item_counts = Counter()
+        # Same mapping as flat arrays (item ids of code c are item_ids[offsets[c]:offsets[c + 1]])
+        self.item_names, self._item_ids = [], {}
+        self.offsets, self.item_ids = np.zeros(1, dtype=np.intp), np.empty(0, dtype=np.intp)
+        super().__init__(codes, values)
+
+    def update(self, codes, values, sign):
+        super().update(codes, values, sign)
+        start = len(self.items_of)
+        for text in values[start:].tolist():
+            self.items_of.append(split_amenities(text))
+        if len(self.items_of) > start:
+            added = [self._item_ids.setdefault(item, len(self._item_ids)) for items in self.items_of[start:] for item in items]
+            self.item_names.extend(list(self._item_ids)[len(self.item_names):])
+            sizes = [len(items) for items in self.items_of[start:]]
+            self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(sizes)])
+            self.item_ids = np.concatenate([self.item_ids, np.asarray(added, dtype=np.intp)])
+        changed, rows = np.unique(codes[codes >= 0], return_counts=True)
+        for code, count in zip(changed.tolist(), rows.tolist()):
+            for item in self.items_of[code]:
+                self.item_counts[item] += sign * count
+        if sign < 0:
+            self.item_counts = +self.item_counts  # drop items no row carries any more
+
+    @property
+    def distinct(self):
+        return len(self.item_counts)
+
+    def items(self):
+        return list(self.item_counts.items())
+
+    def to_dict(self, k=10):
+        return {"rows": self.count, "missing": int(self.missing), "distinct": self.distinct, "top": self.top(k)}
+
+    def count_items(self, codes):
+        """Rows carrying each item among rows with the given codes, as an array over item ids."""
+        per_code = np.bincount(codes[codes >= 0], minlength=len(self.offsets) - 1)
+        used = np.flatnonzero(per_code)
+        starts, stops = self.offsets[used], self.offsets[used + 1]
+        lengths = stops - starts
+        # Item ids of every used code, each weighted by how many rows share that code
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.bincount(self.item_ids[positions], weights=np.repeat(per_code[used], lengths),
+                           minlength=len(self.item_names)).astype(np.int64)
+
+
+class CatalogStats:
+    """Statistics of every live row of a ListingStore; see ListingStore.stats."""
+
+    def __init__(self, store):
+        rows = store.live_rows()
+        self.rows = len(rows)
+        self.numeric = {col: NumericStats(store.numeric[col][rows]) for col in STATS_NUMERIC_COLUMNS}
+        self.text = {col: CategoryStats(store.codes[col][rows], store.values[col]) for col in STATS_TEXT_COLUMNS}
+        self.lists = {col: ListStats(store.codes[col][rows], store.values[col]) for col in STATS_LIST_COLUMNS}
+
+    def update(self, store, rows, sign):
+        """Account for rows appended to (sign=+1) or deleted from (sign=-1) the store."""
+        rows = np.asarray(rows, dtype=np.intp)
+        if not len(rows):
+            return
+        self.rows += sign * len(rows)
+        for col, stats in self.numeric.items():
+            stats.update(store.numeric[col][rows], sign)
+        for col, stats in {**self.text, **self.lists}.items():
+            stats.update(store.codes[col][rows], store.values[col], sign)
+
+    def column(self, name):
+        return self.numeric.get(name) or self.text.get(name) or self.lists.get(name)
+
+    def to_dict(self, top=10):
+        columns = {col: stats.to_dict() for col, stats in self.numeric.items()}
+        columns.update((col, stats.to_dict(top)) for col, stats in {**self.text, **self.lists}.items())
+        return {"rows": self.rows, "columns": columns}
+
+
+def _top_counts(labels, counts, k):
+    # Largest counts first, ties alphabetical; zero counts dropped
+    present = np.flatnonzero(counts > 0)
+    pairs = sorted(zip(np.asarray(labels, dtype=object)[present].tolist(), counts[present].tolist()),
+                   key=lambda item: (-item[1], str(item[0])))
+    return [{"value": value, "count": int(count)} for value, count in (pairs if k is None else pairs[:k])]
+
+
+def facet_counts(store, rows, top=10, price_buckets=PRICE_BUCKETS):
+    """
+    Counts per property_type, location, price bucket, accommodates and tag over
+    the given store rows, each one bincount over encoded columns.
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    facets = {"total": len(rows)}
+    for col in STATS_TEXT_COLUMNS:
+        codes = store.codes[col][rows]
+        counts = np.bincount(codes[codes >= 0], minlength=len(store.values[col]))
+        facets[col] = _top_counts(store.values[col], counts, top)
+
+    edges = np.asarray(price_buckets, dtype=np.float64)
+    prices = store.numeric["price"][rows]
+    buckets = np.searchsorted(edges, prices[prices >= edges[0]], side="right") - 1
+    counts = np.bincount(buckets, minlength=len(edges))
+    labels = [f"{low:g}-{high:g}" for low, high in zip(edges[:-1], edges[1:])] + [f"{edges[-1]:g}+"]
+    facets["price"] = [
+        {"value": label, "min": float(low), "max": None if high is None else float(high), "count": int(count)}
+        for label, low, high, count in zip(labels, edges, list(edges[1:]) + [None], counts.tolist())
+    ]
+
+    accommodates = store.numeric["accommodates"][rows]
+    counts = np.bincount(np.clip(accommodates, 0, None)) if len(rows) else np.zeros(0, dtype=np.int64)
+    facets["accommodates"] = [{"value": int(v), "count": int(counts[v])} for v in np.flatnonzero(counts).tolist()]
+
+    tags = store.stats.lists["tags"]
+    facets["tags"] = _top_counts(tags.item_names, tags.count_items(store.codes["tags"][rows]), top)
+    return facets
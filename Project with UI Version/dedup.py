@@ -0,0 +1,119 @@
+# dedup.py
+"""
+Near-duplicate detection for listings with MinHash signatures and LSH banding.
+
+Each listing becomes a set of shingles (its amenities, its tags, and the words
+and word pairs of its name). A MinHash signature estimates the Jaccard
+similarity of two such sets. Signatures are cut into bands: listings that
+agree on a whole band land in the same bucket, and only those candidates are
+compared. Every listing is checked only against the kept listings it shares
+a bucket with instead of every other listing, so a merge costs about
+O(n * bands) rather than O(n^2) unless most listings are alike.
+"""
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+from listing_index import split_amenities, tokenize
+
+# Smallest prime above 2^32: a * x (both < 2^32) fits in uint64 and wraps it ~2^32 times
+_PRIME = np.uint64(4294967311)
+
+
+@lru_cache(maxsize=65536)
+def _list_features(prefix, text):
+    # Amenity / tag strings repeat across listings; split each distinct one once
+    return frozenset(prefix + item for item in split_amenities(text))
+
+
+def shingles(listing):
+    """Feature set of a listing (dict or Listing)."""
+    get = listing.get if isinstance(listing, dict) else lambda k, d=None: getattr(listing, k, d)
+    amenities, tags = get("amenities"), get("tags")
+    features = set(_list_features("a:", amenities if isinstance(amenities, str) else None))
+    features |= _list_features("t:", tags if isinstance(tags, str) else None)
+    words = tokenize(get("name"))
+    features |= {"n:" + w for w in words}
+    features |= {"n:" + a + " " + b for a, b in zip(words, words[1:])}
+    return features
+
+
+def _hash32(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class MinHasher:
+    """num_perm universal hash functions (a * x + b) mod p over 32-bit shingle hashes."""
+
+    def __init__(self, num_perm=64, seed=7):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signatures(self, shingle_sets, chunk=1024):
+        """(n, num_perm) uint64 signatures; empty sets get all-max rows."""
+        out = np.full((len(shingle_sets), self.num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+        # Hash every distinct shingle once; listings then index into that table
+        ids = {}
+        for shingle_set in shingle_sets:
+            for x in shingle_set:
+                ids.setdefault(x, len(ids))
+        hashes = np.fromiter((_hash32(x) for x in ids), dtype=np.uint64, count=len(ids))
+        table = (np.outer(hashes, self.a) % _PRIME + self.b) % _PRIME
+        for start in range(0, len(shingle_sets), chunk):
+            part = shingle_sets[start:start + chunk]
+            sizes = np.array([len(s) for s in part])
+            if not sizes.sum():
+                continue
+            members = np.fromiter((ids[x] for s in part for x in s), dtype=np.intp, count=int(sizes.sum()))
+            present = np.flatnonzero(sizes)
+            offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])[present]
+            out[start + present] = np.minimum.reduceat(table[members], offsets, axis=0)
+        return out
+
+
+def find_near_duplicates(listings, threshold=0.7, num_perm=64, bands=16, protected=0):
+    """
+    Near-copies in a list of listings, as [(index, duplicate_of, similarity)].
+
+    Listings are scanned in order and each is compared with every kept
+    listing sharing an LSH bucket with it; a listing whose estimated
+    Jaccard similarity with one of them reaches threshold is a duplicate. The
+    first `protected` listings (e.g. real data ahead of synthetic rows) are
+    never reported, only matched against.
+    """
+    sets = [shingles(l) for l in listings]
+    signatures = MinHasher(num_perm).signatures(sets)
+    rows_per_band = num_perm // bands
+    mix = np.random.default_rng(11).integers(1, 1 << 62, size=rows_per_band, dtype=np.uint64)
+    band_keys = np.stack([
+        (signatures[:, b * rows_per_band:(b + 1) * rows_per_band] * mix).sum(axis=1)
+        for b in range(bands)
+    ], axis=1)
+
+    buckets = [dict() for _ in range(bands)]
+    duplicates = []
+    for i, keys in enumerate(band_keys.tolist()):
+        if not sets[i]:
+            continue
+        candidates = {j for band, key in enumerate(keys) for j in buckets[band].get(key, ())}
+        if candidates and i >= protected:
+            candidates = sorted(candidates)
+            sims = (signatures[candidates] == signatures[i]).mean(axis=1)
+            best = int(np.argmax(sims))
+            if sims[best] >= threshold:
+                duplicates.append((i, candidates[best], float(sims[best])))
+                continue
+        for band, key in enumerate(keys):
+            buckets[band].setdefault(key, []).append(i)
+    return duplicates
+
+
+def drop_near_duplicates(listings, threshold=0.7, protected=0, **options):
+    """(listings without near-copies, report of what was dropped)."""
+    duplicates = find_near_duplicates(listings, threshold=threshold, protected=protected, **options)
+    dropped = {i for i, _, _ in duplicates}
+    kept = [l for i, l in enumerate(listings) if i not in dropped]
+    return kept, duplicates
@@ -0,0 +1,260 @@
+# listing_catalog.py
+"""
+Add / update / delete for individual listings without rewriting the CSV.
+
+Every change is appended to a JSON-lines delta log next to the base CSV
+(<csv>.delta.jsonl) and applied to the in-memory ListingStore incrementally:
+deletes and the old version of an updated listing become tombstones, new
+versions are appended as new rows. load_listings() replays the log on top
+of the base file, and a background compaction folds the log back into the
+CSV once it grows past a threshold.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from listing_store import LISTING_FIELDS, normalize_listing_id
+
+DELTA_SUFFIX = ".delta.jsonl"
+
+
+def delta_path(csv_path):
+    return csv_path + DELTA_SUFFIX
+
+
+def read_delta(path):
+    """Entries of a delta log in order; a torn last line (crash mid-write) is ignored."""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+    return entries
+
+
+def replay_delta(store, entries):
+    """
+    Apply logged changes to a freshly loaded store in one batch: only the last
+    change per listing matters, so old rows are tombstoned together and the
+    surviving versions appended together.
+    """
+    final = {}
+    for entry in entries:
+        key = normalize_listing_id(entry["listing_id"])
+        final.pop(key, None)  # re-insert so the last change decides row order
+        final[key] = entry.get("listing") if entry["op"] != "delete" else None
+    old_rows = [store.row_of(key) for key in final]
+    store.delete_rows([row for row in old_rows if row is not None])
+    store.append_records([listing for listing in final.values() if listing is not None])
+    return len(entries)
+
+
+class DeltaLog:
+    """Append-only JSON-lines log of listing changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = len(read_delta(path))
+
+    def append(self, op, listing_id, listing=None):
+        entry = {"op": op, "listing_id": listing_id, "ts": time.time()}
+        if listing is not None:
+            entry["listing"] = listing
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries += 1
+
+
+class ListingCatalog:
+    """
+    One dataset's listings plus its change log. csv_path=None keeps changes in
+    memory only (e.g. the synthetic dataset).
+    """
+
+    def __init__(self, listings, csv_path=None, compact_every=500):
+        self.store = listings.store
+        self.csv_path = csv_path
+        self.log = DeltaLog(delta_path(csv_path)) if csv_path else None
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._next_id = None
+
+    @property
+    def listings(self):
+        return self.store.view()
+
+    def _new_id(self):
+        # Integer ids continue after the largest one; otherwise a fresh text id
+        if self._next_id is None:
+            ints = [i for i in self.store.ids.tolist() if isinstance(i, int) and not isinstance(i, bool)]
+            self._next_id = max(ints, default=-1) + 1 if len(ints) == self.store.size else None
+        if self._next_id is None:
+            return f"L-{uuid.uuid4().hex[:12]}"
+        self._next_id += 1
+        return self._next_id - 1
+
+    def _record(self, fields, listing_id):
+        listing = {f: fields.get(f) for f in LISTING_FIELDS}
+        listing["listing_id"] = listing_id
+        return listing
+
+    def get(self, listing_id):
+        row = self.store.row_of(listing_id)
+        return None if row is None else self.store.records([row])[0]
+
+    def add(self, fields):
+        """Add a listing; returns it (with its listing_id) or None if the id is taken."""
+        with self._lock:
+            listing_id = fields.get("listing_id")
+            if listing_id in (None, ""):
+                listing_id = self._new_id()
+            elif self.store.row_of(listing_id) is not None:
+                return None
+            listing = self._record(fields, listing_id)
+            self._write("add", listing_id, listing)
+            self.store.append_records([listing])
+            return self.get(listing_id)
+
+    def update(self, listing_id, fields):
+        """Change some fields of a listing; returns the new version or None if not found."""
+        with self._lock:
+            row = self.store.row_of(listing_id)
+            if row is None:
+                return None
+            current = self.store.records([row])[0]
+            current = current.to_dict() if hasattr(current, "to_dict") else dict(current)
+            listing = self._record({**current, **fields}, current["listing_id"])
+            self._write("update", current["listing_id"], listing)
+            self.store.delete_rows([row])
+            self.store.append_records([listing])
+            return self.get(listing_id)
+
+    def delete(self, listing_id):
+        with self._lock:
+            row = self.store.row_of(listing_id)
+            if row is None:
+                return False
+            self._write("delete", self.store.ids[row])
+            self.store.delete_rows([row])
+            return True
+
+    def _write(self, op, listing_id, listing=None):
+        if self.log is None:
+            return
+        self.log.append(op, _json_id(listing_id), _json_safe(listing))
+        if self.log.entries >= self.compact_every:
+            self.compact(background=True)
+
+    def compact(self, background=False):
+        """
+        Fold the delta log into the base CSV (atomically) and truncate the log.
+        The file keeps its columns, their order and types: rows no logged
+        change touched are copied as they are, updated rows are rewritten where
+        they stand, deleted rows dropped and added rows appended.
+        """
+        if self.log is None:
+            return
+        if background:
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self.compact, name="listing-compaction", daemon=True)
+                self._compactor.start()
+            return
+
+        with self._lock:
+            logged = os.path.getsize(self.log.path) if os.path.exists(self.log.path) else 0
+            touched = {normalize_listing_id(e["listing_id"]) for e in read_delta(self.log.path)}
+            rows = sorted(row for row in map(self.store.row_of, touched) if row is not None)
+            changed = self.store.frame(rows)
+        # Replace the file a symlinked base CSV points at, not the link itself
+        target = os.path.realpath(self.csv_path)
+        frame = fold_changes(pd.read_csv(target), changed, touched)
+        tmp = target + ".tmp"
+        frame.to_csv(tmp, index=False)
+        os.replace(tmp, target)
+
+        # Keep entries written while the snapshot was being saved
+        with self._lock:
+            tail = b""
+            if os.path.exists(self.log.path):
+                with open(self.log.path, "rb") as f:
+                    f.seek(logged)
+                    tail = f.read()
+            with open(self.log.path + ".tmp", "wb") as f:
+                f.write(tail)
+            os.replace(self.log.path + ".tmp", self.log.path)
+            self.log.entries = tail.count(b"\n")
+
+
+def fold_changes(base, changed, touched):
+    """
+    The base CSV's rows with changes applied, in the base file's schema.
+    changed holds the current version (store columns) of every touched
+    listing that still exists; touched listings missing from it were deleted.
+    """
+    from listings import _standardize_columns  # listings imports this module
+
+    # Same renames and fallback ids as load_listings, so keys match the store's
+    standard = _standardize_columns(base.copy())
+    names = dict(zip(base.columns, standard.columns))
+    current = {normalize_listing_id(v): j for j, v in enumerate(changed["listing_id"].tolist())}
+
+    # (base row, changed row) per output row; the first base row of an id is the one the store tracks
+    order, seen = [], set()
+    for i, key in enumerate(normalize_listing_id(v) for v in standard["listing_id"].tolist()):
+        if key not in touched or key in seen:
+            order.append((i, None))
+        elif key in current:
+            order.append((i, current[key]))
+        seen.add(key)
+    order.extend((None, j) for key, j in current.items() if key not in seen)
+
+    columns = {}
+    for col in base.columns:
+        old = base[col].to_numpy(dtype=object)
+        new = changed[names[col]].to_numpy(dtype=object) if names[col] in changed else None
+        values = [
+            new[j] if j is not None and new is not None else (old[i] if i is not None else None)
+            for i, j in order
+        ]
+        columns[col] = _like(pd.Series(values, dtype=object), base[col].dtype)
+    return pd.DataFrame(columns, columns=base.columns)
+
+
+def _like(values, dtype):
+    # Back to the column's type; integers become nullable Int64 so a missing value keeps them integral
+    if pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype):
+        return values
+    numbers = pd.to_numeric(values, errors="coerce")
+    if numbers.isna().sum() > values.isna().sum():
+        return values  # text crept into a numeric column; keep it rather than lose it
+    if pd.api.types.is_integer_dtype(dtype):
+        return numbers.round().astype("Int64")
+    return numbers.astype(dtype)
+
+
+def _json_id(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def _json_safe(listing):
+    if listing is None:
+        return None
+    out = {}
+    for key, value in listing.items():
+        if hasattr(value, "item"):
+            value = value.item()
+        if isinstance(value, float) and value != value:
+            value = None
+        out[key] = value
+    return out
@@ -0,0 +1,734 @@
+# listing_index.py
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# Fields searched by keyword / environment filters
+INDEXED_FIELDS = ("tags", "location", "property_type", "name")
+# Fields offered as autocomplete suggestions
+SUGGEST_FIELDS = ("location", "property_type", "name")
+# Fields matched by typo-tolerant (fuzzy) keyword search
+FUZZY_FIELDS = ("location", "name", "tags")
+# Fields scored by ranked (BM25) full-text search
+RANKED_FIELDS = ("name", "tags", "amenities")
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * np.pi / 180  # along a meridian
+
+
+def tokenize(text):
+    """Lowercase word tokens: "Princess-Rosethorn, ON" -> ["princess", "rosethorn", "on"]."""
+    if text is None:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def split_amenities(text):
+    """ "Wifi, Free parking on premises" -> ["wifi", "free parking on premises"]"""
+    if text is None:
+        return []
+    return [a.strip().lower() for a in str(text).split(",") if a.strip()]
+
+
+def trigrams(token):
+    """Character trigrams of a padded token: "lake" -> {"  l", " la", "lak", "ake", "ke "}."""
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _best_per_row(rows, scores):
+    # Unique rows (ascending) with the highest score seen for each
+    order = np.lexsort((-scores, rows))
+    rows, scores = rows[order], scores[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = rows[1:] != rows[:-1]
+    return rows[first], scores[first]
+
+
+def extend_buffer(buffer, used, added):
+    """
+    Append added after the first `used` entries of an over-allocated buffer.
+    Returns (buffer, used); the buffer is reallocated at twice the size when
+    full, so appending a few entries at a time is amortized O(1) per entry.
+    """
+    if len(buffer) < used + len(added):
+        bigger = np.empty(max(used + len(added), 2 * len(buffer), 64), dtype=buffer.dtype)
+        bigger[:used] = buffer[:used]
+        buffer = bigger
+    buffer[used:used + len(added)] = added
+    return buffer, used + len(added)
+
+
+def _expand_ranges(starts, stops):
+    """Concatenated aranges: positions starts[i]..stops[i]-1 for every i."""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.intp)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (NumPy-vectorized)."""
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def rows_by_code(codes, n_values):
+    """
+    Group store rows by dictionary code.
+    Returns (order, bounds): rows holding code c are order[bounds[c]:bounds[c + 1]],
+    in ascending row order. Rows with the missing code (-1) are left out.
+    """
+    order = np.argsort(codes, kind="stable").astype(np.int32)
+    bounds = np.searchsorted(codes[order], np.arange(n_values + 1))
+    return order, bounds
+
+
+def _field_postings(codes, values):
+    # Tokenize each distinct value once, then expand codes to rows.
+    order, bounds = rows_by_code(codes, len(values))
+    token_codes = defaultdict(list)
+    for code, text in enumerate(values):
+        for token in set(tokenize(text)):
+            token_codes[token].append(code)
+
+    postings = {}
+    for token, code_list in token_codes.items():
+        parts = [order[bounds[c]:bounds[c + 1]] for c in code_list]
+        rows = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        postings[token] = np.sort(rows) if len(parts) > 1 else rows
+    return postings
+
+
+class TokenIndex:
+    """
+    Inverted index from normalized tokens to posting lists (sorted int32 arrays
+    of store rows), kept separately per text field so callers can choose which
+    fields a keyword is matched against.
+    """
+
+    def __init__(self, store, fields=INDEXED_FIELDS):
+        self.fields = tuple(fields)
+        self.postings = {
+            field: _field_postings(store.codes[field], store.values[field])
+            for field in self.fields
+        }
+
+    def add_rows(self, store, rows):
+        """
+        Index rows appended to the store. They are past every existing row, so
+        appending keeps posting lists sorted. Returns tokens new to the index.
+        """
+        added = set()
+        for field in self.fields:
+            postings = self.postings[field]
+            values, codes = store.values[field], store.codes[field]
+            for row in rows:
+                code = codes[row]
+                if code < 0:
+                    continue
+                for token in set(tokenize(values[code])):
+                    if token in postings:
+                        postings[token] = np.append(postings[token], np.int32(row))
+                    else:
+                        postings[token] = np.array([row], dtype=np.int32)
+                        added.add(token)
+        return added
+
+    def token_rows(self, token, fields):
+        """Rows where the token appears in at least one of the fields."""
+        parts = [self.postings[f][token] for f in fields if token in self.postings.get(f, {})]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        rows = parts[0]
+        for part in parts[1:]:
+            rows = np.union1d(rows, part)
+        return rows
+
+    def rows(self, keyword, fields):
+        """Rows matching every token of the keyword (each in any of the fields)."""
+        tokens = set(tokenize(keyword))
+        if not tokens:
+            return np.empty(0, dtype=np.int32)
+        # Intersect the shortest posting lists first
+        lists = sorted((self.token_rows(t, fields) for t in tokens), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+
+class TrigramIndex:
+    """
+    Character-trigram index over the token vocabulary of a TokenIndex. A
+    misspelt word is compared only with vocabulary tokens sharing at least
+    one trigram with it (never with every listing), so lookup cost follows
+    the vocabulary, which grows far slower than the catalog.
+    """
+
+    def __init__(self, token_index, fields=FUZZY_FIELDS):
+        self.token_index = token_index
+        self.fields = tuple(fields)
+        self.vocabulary = sorted({t for f in self.fields for t in token_index.postings.get(f, {})})
+        self.ids = {t: i for i, t in enumerate(self.vocabulary)}
+        grams = defaultdict(list)
+        sizes = []
+        for token_id, token in enumerate(self.vocabulary):
+            token_grams = trigrams(token)
+            sizes.append(len(token_grams))
+            for gram in token_grams:
+                grams[gram].append(token_id)
+        self.sizes = np.array(sizes, dtype=np.int32)
+        self.postings = {g: np.array(ids, dtype=np.int32) for g, ids in grams.items()}
+
+    def add_tokens(self, tokens):
+        """Add tokens that appeared after the index was built."""
+        for token in sorted(set(tokens) - self.ids.keys()):
+            token_id = self.ids[token] = len(self.vocabulary)
+            self.vocabulary.append(token)
+            token_grams = trigrams(token)
+            self.sizes = np.append(self.sizes, np.int32(len(token_grams)))
+            for gram in token_grams:
+                ids = self.postings.get(gram)
+                self.postings[gram] = np.array([token_id], dtype=np.int32) if ids is None else np.append(ids, np.int32(token_id))
+
+    def similar(self, word, threshold=0.3, limit=20):
+        """
+        Vocabulary tokens resembling word as [(token, similarity)], best first.
+        Similarity is the Jaccard overlap of trigram sets (1.0 = same token).
+        """
+        wanted = trigrams(word)
+        parts = [self.postings[g] for g in wanted if g in self.postings]
+        if not parts:
+            return []
+        ids, shared = np.unique(np.concatenate(parts), return_counts=True)
+        similarity = shared / (len(wanted) + self.sizes[ids] - shared)
+        keep = similarity >= threshold
+        ids, similarity = ids[keep], similarity[keep]
+        best = np.lexsort((ids, -similarity))[:limit]
+        return [(self.vocabulary[i], float(similarity[k])) for k, i in zip(best, ids[best].tolist())]
+
+    def rows(self, keyword, fields=None, threshold=0.3):
+        """
+        Rows matching every word of keyword approximately, as (rows, scores):
+        rows ascending, score = mean over words of the best similarity found
+        in that row. Exact matches score 1.0.
+        """
+        fields = tuple(fields or self.fields)
+        words = set(tokenize(keyword))
+        rows = np.empty(0, dtype=np.int32)
+        scores = np.empty(0)
+        for n, word in enumerate(sorted(words)):
+            matches = self.similar(word, threshold)
+            parts = [(self.token_index.token_rows(t, fields), sim) for t, sim in matches]
+            parts = [(r, sim) for r, sim in parts if len(r)]
+            if not parts:
+                return np.empty(0, dtype=np.int32), np.empty(0)
+            word_rows, word_scores = _best_per_row(
+                np.concatenate([r for r, _ in parts]),
+                np.concatenate([np.full(len(r), sim) for r, sim in parts]),
+            )
+            if n == 0:
+                rows, scores = word_rows, word_scores
+            else:
+                rows, left, right = np.intersect1d(rows, word_rows, assume_unique=True, return_indices=True)
+                scores = scores[left] + word_scores[right]
+            if not len(rows):
+                break
+        return rows, scores / max(1, len(words))
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the name, tags and amenities of each listing (scored as
+    one document). Postings are kept per distinct field value, with term
+    frequencies, and expanded to store rows through the dictionary codes at
+    query time. Rows that share an amenities string share its postings, so
+    the index stays small at 1M listings. Scoring is vectorized per posting
+    list.
+
+    Adds and deletes patch the index in place: new values are tokenized into
+    the postings, the document count and total length are running totals,
+    and rows appended since the last grouping are scanned directly as a short
+    tail until it is folded into the per-value row groups.
+    """
+
+    def __init__(self, store, fields=RANKED_FIELDS, k1=1.2, b=0.75):
+        self.fields = tuple(fields)
+        self.k1 = k1
+        self.b = b
+        self.deleted = store.deleted
+        self.rows_total = 0
+        self.size = 0             # live documents
+        self.total_length = 0.0   # summed length of the live documents
+        self.lengths = np.empty(0, dtype=np.float64)  # per row; over-allocated
+        self.codes = {}
+        self.groups = {field: (np.empty(0, dtype=np.int32), np.zeros(1, dtype=np.intp)) for field in self.fields}
+        self.grouped = 0          # rows covered by the groups; later rows are the tail
+        self.postings = {field: {} for field in self.fields}  # field -> term -> [codes, tfs, used]
+        self.value_lengths = {field: (np.empty(0, dtype=np.float64), 0) for field in self.fields}
+        self._term_cache = {}
+        self.add_rows(store, np.arange(store.size, dtype=np.intp))
+
+    @property
+    def avg_length(self):
+        return self.total_length / self.size if self.size else 0.0
+
+    def add_rows(self, store, rows):
+        """Index rows appended to the store (always its newest rows)."""
+        rows = np.asarray(rows, dtype=np.intp)
+        self.deleted = store.deleted
+        self.rows_total = store.size
+        lengths = np.zeros(len(rows), dtype=np.float64)
+        for field in self.fields:
+            codes, values = store.codes[field], store.values[field]
+            self.codes[field] = codes
+            value_lengths, known = self.value_lengths[field]
+            if len(values) > known:
+                # Tokenize only the distinct values the index has not seen
+                added, terms = [], defaultdict(lambda: ([], []))
+                for code, text in enumerate(values[known:].tolist(), start=known):
+                    counts = Counter(tokenize(text))
+                    added.append(sum(counts.values()))
+                    for term, tf in counts.items():
+                        terms[term][0].append(code)
+                        terms[term][1].append(tf)
+                postings = self.postings[field]
+                for term, (term_codes, tfs) in terms.items():
+                    posting = postings.setdefault(term, [np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64), 0])
+                    posting[0], _ = extend_buffer(posting[0], posting[2], term_codes)
+                    posting[1], posting[2] = extend_buffer(posting[1], posting[2], tfs)
+                value_lengths, known = extend_buffer(value_lengths, known, added)
+                self.value_lengths[field] = (value_lengths, known)
+            row_codes = codes[rows]
+            present = row_codes >= 0
+            lengths[present] += value_lengths[row_codes[present]]
+        self.lengths, _ = extend_buffer(self.lengths, self.rows_total - len(rows), lengths)
+
+        live = np.ones(len(rows), dtype=bool) if self.deleted is None else ~self.deleted[rows]
+        self.size += int(live.sum())
+        self.total_length += float(lengths[live].sum())
+        if self.rows_total - self.grouped > max(256, self.grouped // 16):
+            self._regroup()
+        self._term_cache.clear()
+
+    def remove_rows(self, store, rows):
+        """Account for rows the store has just tombstoned."""
+        rows = np.asarray(rows, dtype=np.intp)
+        self.deleted = store.deleted
+        self.size -= len(rows)
+        self.total_length -= float(self.lengths[rows].sum())
+        self._term_cache.clear()
+
+    def _regroup(self):
+        # Fold the tail into the per-value row groups
+        for field in self.fields:
+            self.groups[field] = rows_by_code(self.codes[field][:self.rows_total], self.value_lengths[field][1])
+        self.grouped = self.rows_total
+
+    def term_rows(self, term):
+        """(rows ascending, term frequency summed over the fields) for one term."""
+        cached = self._term_cache.get(term)
+        if cached is not None:
+            return cached
+        row_parts, tf_parts = [], []
+        for field in self.fields:
+            posting = self.postings[field].get(term)
+            if posting is None:
+                continue
+            codes, tfs = posting[0][:posting[2]], posting[1][:posting[2]]
+            order, bounds = self.groups[field]
+            grouped = codes < len(bounds) - 1  # values first seen in the tail have no group yet
+            starts, stops = bounds[codes[grouped]], bounds[codes[grouped] + 1]
+            row_parts.append(order[_expand_ranges(starts, stops)])
+            tf_parts.append(np.repeat(tfs[grouped], stops - starts))
+            if self.rows_total > self.grouped:
+                # Posting codes are ascending, so tail rows are matched by binary search
+                tail = self.codes[field][self.grouped:self.rows_total]
+                at = np.minimum(np.searchsorted(codes, tail), len(codes) - 1)
+                hit = codes[at] == tail
+                row_parts.append(self.grouped + np.flatnonzero(hit))
+                tf_parts.append(tfs[at[hit]])
+        result = self._sum_by_row(row_parts, tf_parts)
+        if self.deleted is not None:
+            keep = ~self.deleted[result[0]]
+            result = (result[0][keep], result[1][keep])
+        if len(self._term_cache) >= 1024:  # query terms are user input; keep the memo bounded
+            self._term_cache.clear()
+        self._term_cache[term] = result
+        return result
+
+    def _sum_by_row(self, row_parts, value_parts):
+        # Sum values that land on the same row; rows come back ascending
+        if not row_parts:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+        rows, values = np.concatenate(row_parts), np.concatenate(value_parts)
+        if len(rows) * 8 >= self.rows_total:
+            # Dense accumulation is a linear pass; cheaper than sorting big lists
+            totals = np.bincount(rows, weights=values, minlength=self.rows_total)
+            present = np.bincount(rows, minlength=self.rows_total) > 0
+            hit = np.flatnonzero(present)
+            return hit, totals[hit]
+        rows, inverse = np.unique(rows, return_inverse=True)
+        return rows, np.bincount(inverse, weights=values)
+
+    def search(self, query):
+        """Rows containing any query term, as (rows ascending, BM25 scores)."""
+        row_parts, score_parts = [], []
+        for term in set(tokenize(query)):
+            rows, tf = self.term_rows(term)
+            if not len(rows):
+                continue
+            df = len(rows)
+            idf = np.log(1.0 + (self.size - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.lengths[rows] / (self.avg_length or 1.0))
+            row_parts.append(rows)
+            score_parts.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+        if len(row_parts) == 1:
+            return row_parts[0], score_parts[0]
+        return self._sum_by_row(row_parts, score_parts)
+
+
+class GridIndex:
+    """
+    Uniform grid over listing coordinates. Rows are sorted by cell key
+    (cell row * width + cell column), so each band of cells a query box covers
+    is one contiguous slice found by binary search. Only rows in those cells
+    get an exact distance or bounds check. Rows without coordinates are left
+    out.
+    """
+
+    def __init__(self, lat, lon, cell_km=1.0):
+        self.lat = lat
+        self.lon = lon
+        self.cell = cell_km / KM_PER_DEGREE  # cell edge in degrees
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        self.size = len(valid)
+        if not self.size:
+            self.order = np.empty(0, dtype=np.int32)
+            self.keys = np.empty(0, dtype=np.int64)
+            return
+        i = np.floor(lat[valid] / self.cell).astype(np.int64)
+        j = np.floor(lon[valid] / self.cell).astype(np.int64)
+        self.i0, self.i1 = int(i.min()), int(i.max())
+        self.j0, self.j1 = int(j.min()), int(j.max())
+        self.width = self.j1 - self.j0 + 1
+        keys = (i - self.i0) * self.width + (j - self.j0)
+        order = np.argsort(keys, kind="stable")
+        self.order = valid[order].astype(np.int32)
+        self.keys = keys[order]
+
+    def add_rows(self, rows):
+        """
+        Insert rows appended to the store (coordinates read from the current
+        columns). Returns False when a point falls outside the grid's extent
+        and the index has to be rebuilt instead.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        rows = rows[np.isfinite(self.lat[rows]) & np.isfinite(self.lon[rows])]
+        if not len(rows):
+            return True
+        if not self.size:
+            return False
+        i = np.floor(self.lat[rows] / self.cell).astype(np.int64)
+        j = np.floor(self.lon[rows] / self.cell).astype(np.int64)
+        if i.min() < self.i0 or i.max() > self.i1 or j.min() < self.j0 or j.max() > self.j1:
+            return False
+        keys = (i - self.i0) * self.width + (j - self.j0)
+        by_key = np.argsort(keys, kind="stable")
+        keys, rows = keys[by_key], rows[by_key]
+        at = np.searchsorted(self.keys, keys, side="right")
+        self.keys = np.insert(self.keys, at, keys)
+        self.order = np.insert(self.order, at, rows.astype(np.int32))
+        self.size += len(rows)
+        return True
+
+    def _candidates(self, south, west, north, east):
+        # Rows in every grid cell the box touches
+        if not self.size:
+            return self.order
+        i_lo = max(int(np.floor(south / self.cell)), self.i0)
+        i_hi = min(int(np.floor(north / self.cell)), self.i1)
+        j_lo = max(int(np.floor(west / self.cell)), self.j0)
+        j_hi = min(int(np.floor(east / self.cell)), self.j1)
+        if i_lo > i_hi or j_lo > j_hi:
+            return np.empty(0, dtype=np.int32)
+        bands = (np.arange(i_lo, i_hi + 1) - self.i0) * self.width
+        starts = np.searchsorted(self.keys, bands + (j_lo - self.j0), side="left")
+        stops = np.searchsorted(self.keys, bands + (j_hi - self.j0), side="right")
+        return self.order[_expand_ranges(starts, stops)]
+
+    def _wrapped_candidates(self, south, west, north, east):
+        # A box with west > east crosses the antimeridian: the two pieces either side of it
+        if west <= east:
+            return self._candidates(south, west, north, east)
+        return np.concatenate([self._candidates(south, west, north, 180.0),
+                               self._candidates(south, -180.0, north, east)])
+
+    def bbox_rows(self, south, west, north, east):
+        """Rows inside the box, ascending (west > east means the box crosses ±180°)."""
+        rows = self._wrapped_candidates(south, west, north, east)
+        lat, lon = self.lat[rows], self.lon[rows]
+        in_lon = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+        inside = (lat >= south) & (lat <= north) & in_lon
+        return np.sort(rows[inside])
+
+    def radius_rows(self, lat, lon, km):
+        """Rows within km of (lat, lon), as (rows ascending, distances in km)."""
+        dlat = km / KM_PER_DEGREE
+        south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        # Widest longitude span is at the band's edge nearest a pole (from the
+        # haversine formula: sin(d/2) >= cos(lat) * sin(dlon/2) for any point within d)
+        spread = np.sin(km / EARTH_RADIUS_KM / 2) / np.cos(np.radians(max(abs(south), abs(north))))
+        if km / EARTH_RADIUS_KM >= np.pi or not spread < 1.0:
+            rows = self._candidates(south, -180.0, north, 180.0)  # the circle reaches round a pole
+        else:
+            dlon = np.degrees(2 * np.arcsin(spread))
+            west, east = (lon - dlon + 180.0) % 360.0 - 180.0, (lon + dlon + 180.0) % 360.0 - 180.0
+            rows = self._wrapped_candidates(south, west, north, east)
+        rows = np.sort(rows)
+        distances = haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+        near = distances <= km
+        return rows[near], distances[near]
+
+
+class SortedIndex:
+    """
+    Store rows ordered by a numeric column. Range queries are two binary
+    searches and return the matching rows as a candidate set.
+    """
+
+    def __init__(self, values, order=None):
+        if order is None:
+            order = np.argsort(values, kind="stable").astype(np.int32)
+        self.order = order
+        self.sorted_values = values[self.order]
+
+    def _bounds(self, low=None, high=None):
+        lo = 0 if low is None else int(np.searchsorted(self.sorted_values, low, side="left"))
+        hi = len(self.order) if high is None else int(np.searchsorted(self.sorted_values, high, side="right"))
+        return lo, max(lo, hi)
+
+    def insert(self, values, rows):
+        """Add rows appended to the store (ascending); they sort after existing rows with equal values."""
+        by_value = np.argsort(values, kind="stable")
+        values, rows = np.asarray(values)[by_value], np.asarray(rows)[by_value]
+        at = np.searchsorted(self.sorted_values, values, side="right")
+        self.order = np.insert(self.order, at, rows.astype(self.order.dtype))
+        self.sorted_values = np.insert(self.sorted_values, at, values)
+
+    def count(self, low=None, high=None):
+        lo, hi = self._bounds(low, high)
+        return hi - lo
+
+    def range_rows(self, low=None, high=None):
+        """Rows with low <= value <= high, in ascending row order."""
+        lo, hi = self._bounds(low, high)
+        return np.sort(self.order[lo:hi])
+
+
+class AmenityIndex:
+    """
+    Global amenity vocabulary plus a packed bitset (uint64 words, one bit per
+    vocabulary entry) for every distinct amenities string. Listings reach
+    their bitset through the amenities code, so rows that share an amenities
+    string share one bitset, and must-have checks are vectorized bitwise ANDs
+    instead of substring searches over ~1.5 KB strings.
+    """
+
+    def __init__(self, store):
+        values = store.values["amenities"]
+        self.codes = store.codes["amenities"]
+        self.vocabulary = []
+        self.ids = {}
+
+        pair_codes, pair_ids = [], []
+        for code, text in enumerate(values):
+            for amenity in split_amenities(text):
+                amenity_id = self.ids.get(amenity)
+                if amenity_id is None:
+                    amenity_id = self.ids[amenity] = len(self.vocabulary)
+                    self.vocabulary.append(amenity)
+                pair_codes.append(code)
+                pair_ids.append(amenity_id)
+
+        self.words = max(1, (len(self.vocabulary) + 63) // 64)
+        # One extra all-zero row for the missing code (-1)
+        self.bits = np.zeros((len(values) + 1, self.words), dtype=np.uint64)
+        pair_ids = np.asarray(pair_ids, dtype=np.uint64)
+        np.bitwise_or.at(
+            self.bits,
+            (np.asarray(pair_codes, dtype=np.intp), (pair_ids // 64).astype(np.intp)),
+            np.left_shift(np.uint64(1), pair_ids % np.uint64(64)),
+        )
+        self._pairs = (np.asarray(pair_codes, dtype=np.intp), pair_ids.astype(np.intp))
+        self._row_counts = None
+        self._vocab_tokens = None
+        self._resolved = {}
+
+    @property
+    def row_counts(self):
+        """Number of store rows carrying each vocabulary entry (document frequency)."""
+        if self._row_counts is None:
+            pair_codes, pair_ids = self._pairs
+            value_rows = np.bincount(self.codes[self.codes >= 0], minlength=len(self.bits) - 1)
+            self._row_counts = np.bincount(
+                pair_ids, weights=value_rows[pair_codes], minlength=len(self.vocabulary)
+            ).astype(np.int64)
+        return self._row_counts
+
+    def add_values(self, store):
+        """Give amenities strings added to the store since this index was built their bitsets."""
+        values = store.values["amenities"]
+        self.codes = store.codes["amenities"]
+        old = len(self.bits) - 1
+        new_bits = []
+        pair_codes, pair_ids = [], []
+        for code in range(old, len(values)):
+            ids = []
+            for amenity in split_amenities(values[code]):
+                amenity_id = self.ids.get(amenity)
+                if amenity_id is None:
+                    amenity_id = self.ids[amenity] = len(self.vocabulary)
+                    self.vocabulary.append(amenity)
+                    if self._vocab_tokens is not None:
+                        self._vocab_tokens.append(set(tokenize(amenity)))
+                ids.append(amenity_id)
+                pair_codes.append(code)
+                pair_ids.append(amenity_id)
+            new_bits.append(ids)
+        words = max(1, (len(self.vocabulary) + 63) // 64)
+        if words > self.words:
+            self.bits = np.hstack([self.bits, np.zeros((len(self.bits), words - self.words), dtype=np.uint64)])
+            self.words = words
+        if new_bits:
+            rows = [self._word_mask(ids) for ids in new_bits]
+            # The missing-code slot stays last
+            self.bits = np.vstack([self.bits[:old], rows, self.bits[old:]])
+            self._pairs = (np.concatenate([self._pairs[0], np.asarray(pair_codes, dtype=np.intp)]),
+                           np.concatenate([self._pairs[1], np.asarray(pair_ids, dtype=np.intp)]))
+        self._row_counts = None
+        self._resolved.clear()  # new vocabulary entries may match old requests
+
+    def resolve(self, amenity):
+        """
+        Vocabulary ids an amenity request matches: every entry containing all
+        of its words, so "wifi" also matches "fast wifi – 300 mbps" and "free
+        parking" matches "free parking on premises" and "free street parking".
+        """
+        amenity = amenity.strip().lower()
+        if amenity not in self._resolved:
+            wanted = set(tokenize(amenity))
+            if self._vocab_tokens is None:
+                self._vocab_tokens = [set(tokenize(a)) for a in self.vocabulary]
+            ids = [i for i, tokens in enumerate(self._vocab_tokens) if wanted and wanted <= tokens]
+            if amenity in self.ids and self.ids[amenity] not in ids:
+                ids.append(self.ids[amenity])
+            if len(self._resolved) >= 4096:  # queries are user input; keep the memo bounded
+                self._resolved.clear()
+            self._resolved[amenity] = ids
+        return self._resolved[amenity]
+
+    def _word_mask(self, amenity_ids):
+        mask = np.zeros(self.words, dtype=np.uint64)
+        for i in amenity_ids:
+            mask[i // 64] |= np.uint64(1) << np.uint64(i % 64)
+        return mask
+
+    def value_mask(self, amenities):
+        """Per distinct amenities string (plus the missing slot): has every must-have."""
+        ok = np.ones(len(self.bits), dtype=bool)
+        for amenity in amenities:
+            ids = self.resolve(amenity)
+            if not ids:
+                return np.zeros(len(self.bits), dtype=bool)
+            ok &= (self.bits & self._word_mask(ids)).any(axis=1)
+        return ok
+
+    def row_mask(self, amenities):
+        return self.value_mask(amenities)[self.codes]
+
+    def listing_bits(self, rows):
+        """Packed amenity bitsets of the given store rows."""
+        return self.bits[self.codes[rows]]
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over the distinct values of text columns, with
+    listing counts. All completions of a prefix sit in one contiguous slice of
+    the sorted keys, found with two binary searches; only that slice is ranked.
+    """
+
+    def __init__(self, store, fields=SUGGEST_FIELDS):
+        self.fields = tuple(fields)
+        self.entries = {}
+        for field in self.fields:
+            codes = store.codes[field]
+            if store.deleted is not None:
+                codes = codes[~store.deleted]
+            counts = np.bincount(codes[codes >= 0], minlength=len(store.values[field]))
+            # Values that differ only in case share one key; show the most common spelling
+            merged = {}
+            for text, key, count in zip(store.values[field], store.lowered(field), counts.tolist()):
+                total, label, best = merged.get(key, (0, text, -1))
+                if count > best:
+                    label, best = text, count
+                merged[key] = (total + count, label, best)
+            keys = sorted(merged)
+            self.entries[field] = (
+                keys,
+                [merged[k][1] for k in keys],
+                np.array([merged[k][0] for k in keys], dtype=np.int64),
+            )
+
+    def adjust(self, field, value, delta):
+        """Add delta listings to a value's count (a listing was added or deleted)."""
+        if field not in self.entries or value is None:
+            return
+        keys, labels, counts = self.entries[field]
+        key = str(value).lower()
+        at = bisect_left(keys, key)
+        if at < len(keys) and keys[at] == key:
+            counts[at] += delta
+        elif delta > 0:
+            keys.insert(at, key)
+            labels.insert(at, value)
+            self.entries[field] = (keys, labels, np.insert(counts, at, delta))
+
+    def complete(self, prefix, limit=10, fields=None):
+        """
+        Values starting with prefix (case-insensitive) as (field, value, count),
+        most listings first, then alphabetical.
+        """
+        prefix = (prefix or "").strip().lower()
+        if not prefix or limit <= 0:
+            return []
+        found = []
+        for field in fields or self.fields:
+            if field not in self.entries:
+                continue
+            keys, labels, counts = self.entries[field]
+            lo = bisect_left(keys, prefix)
+            hi = bisect_left(keys, prefix + "\U0010ffff", lo)
+            picked = np.arange(lo, hi)
+            if len(picked) > limit:
+                # Partial selection: everything above the limit-th largest
+                # count, then ties at that count in alphabetical order
+                segment = counts[lo:hi]
+                kth = np.partition(segment, len(segment) - limit)[len(segment) - limit]
+                above = np.flatnonzero(segment > kth)
+                ties = np.flatnonzero(segment == kth)[:limit - len(above)]
+                picked = lo + np.concatenate([above, ties])
+            found.extend((-int(counts[i]), keys[i], field, labels[i]) for i in picked.tolist() if counts[i] > 0)
+        found.sort()
+        return [(field, label, -neg) for neg, _, field, label in found[:limit]]
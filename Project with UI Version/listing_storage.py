@@ -0,0 +1,457 @@
+# listing_storage.py
+"""
+Binary on-disk formats for the columnar listing store.
+
+Cache: after a CSV is parsed once, its standardized columns are written next
+to it as "<csv>.cache.npz". Later loads read that file instead of running
+pd.read_csv again. The cache records the CSV's size, mtime and SHA-256 and is
+ignored as soon as the CSV no longer matches.
+
+Store directory: the same columns laid out as raw fixed-width binary files
+(plus a string heap and offsets file per text column) that open_store()
+memory-maps. Catalogs larger than RAM can be filtered and sorted while the
+OS page cache does the work, and several server processes reading the same
+directory share one physical copy of the data.
+
+Strings are stored as a UTF-8 byte heap plus an int64 offsets array, so no
+pickling is involved. Listing ids are int64 when every id is an integer;
+otherwise each id carries a type tag (int, float, str, missing) next to an
+int64, a float64 and a string column, so a reloaded id has the same value and
+type as one parsed from the CSV.
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import zipfile
+
+import numpy as np
+
+from listing_store import (
+    INTERNED_COLUMNS, ListingStore, NUMERIC_COLUMNS, PRESORTED_COLUMNS, TEXT_COLUMNS,
+)
+
+CACHE_SUFFIX = ".cache.npz"
+CACHE_FORMAT = 3
+
+STORE_META = "meta.json"
+STORE_FORMAT = 3
+
+
+def cache_path(csv_path):
+    return str(csv_path) + CACHE_SUFFIX
+
+
+# String heaps
+
+def encode_strings(values):
+    """Pack strings into (heap, offsets): value i is heap[offsets[i]:offsets[i + 1]]."""
+    encoded = [str(v).encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    heap = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return heap, offsets
+
+
+def decode_strings(heap, offsets):
+    data = bytes(heap)
+    bounds = offsets.tolist()
+    return [data[a:b].decode("utf-8") for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+class StringHeap:
+    """
+    Read-only sequence of strings backed by a (memory-mapped) UTF-8 heap and
+    offsets array. Values are decoded on access, so opening a store does not
+    pull every name or amenities string into Python objects.
+    """
+
+    _CHUNK = 4096
+
+    def __init__(self, heap, offsets):
+        self.heap = heap
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _decode(self, i):
+        return bytes(self.heap[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            return self._decode(int(index))
+        if isinstance(index, slice):
+            index = range(*index.indices(len(self)))
+        return np.asarray([self._decode(i) for i in np.asarray(index).tolist()], dtype=object)
+
+    def __iter__(self):
+        # Decode a block of values per heap read instead of one read per value
+        for start in range(0, len(self), self._CHUNK):
+            stop = min(start + self._CHUNK, len(self))
+            yield from decode_strings(self.heap[self.offsets[start]:self.offsets[stop]],
+                                      self.offsets[start:stop + 1] - self.offsets[start])
+
+    def tolist(self):
+        return list(self)
+
+
+# Listing ids
+
+ID_INT, ID_FLOAT, ID_STR, ID_NONE = range(4)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def encode_ids(ids):
+    """Split ids into (kinds, ints, floats, strings), one entry per id in each."""
+    n = len(ids)
+    kinds = np.full(n, ID_NONE, dtype=np.uint8)
+    ints = np.zeros(n, dtype=np.int64)
+    floats = np.zeros(n, dtype=np.float64)
+    strings = [""] * n
+    for i, value in enumerate(ids):
+        if _is_int(value):
+            kinds[i], ints[i] = ID_INT, value
+        elif isinstance(value, float):
+            kinds[i], floats[i] = ID_FLOAT, value
+        elif value is not None:
+            kinds[i], strings[i] = ID_STR, str(value)
+    return kinds, ints, floats, strings
+
+
+def decode_ids(kinds, ints, floats, strings):
+    """Object array of ids from encode_ids() parts; strings may be a list or StringHeap."""
+    kinds = np.asarray(kinds)
+    ids = np.empty(len(kinds), dtype=object)
+    for kind, source in ((ID_INT, ints), (ID_FLOAT, floats), (ID_STR, strings)):
+        where = np.flatnonzero(kinds == kind)
+        if len(where):
+            ids[where] = np.asarray(source, dtype=object)[where] if isinstance(source, list) else source[where].tolist()
+    return ids
+
+
+class MixedIds:
+    """Read-only ids of a store whose ids are not all integers, decoded on access."""
+
+    def __init__(self, kinds, ints, floats, strings):
+        self.kinds, self.ints, self.floats, self.strings = kinds, ints, floats, strings
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            kind = self.kinds[index]
+            if kind == ID_INT:
+                return int(self.ints[index])
+            if kind == ID_FLOAT:
+                return float(self.floats[index])
+            return self.strings[index] if kind == ID_STR else None
+        if isinstance(index, slice):
+            index = np.arange(*index.indices(len(self)))
+        index = np.asarray(index)
+        if index.dtype == bool:
+            index = np.flatnonzero(index)
+        kinds = self.kinds[index]
+        ids = np.empty(len(index), dtype=object)
+        for kind, source in ((ID_INT, self.ints), (ID_FLOAT, self.floats), (ID_STR, self.strings)):
+            where = np.flatnonzero(kinds == kind)
+            if len(where):
+                ids[where] = source[index[where]].tolist()
+        return ids
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        return decode_ids(self.kinds, self.ints, self.floats, self.strings).tolist()
+
+
+# CSV fingerprint
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_sha256(path)}
+
+
+def _cache_is_fresh(meta, csv_path):
+    if meta.get("format") != CACHE_FORMAT:
+        return False
+    st = os.stat(csv_path)
+    if st.st_size != meta.get("size"):
+        return False
+    if st.st_mtime_ns == meta.get("mtime_ns"):
+        return True
+    # Touched but maybe not changed (copied, checked out again): compare contents.
+    return file_sha256(csv_path) == meta.get("sha256")
+
+
+# Store <-> arrays
+
+def _store_arrays(store):
+    """Flatten a store into named NumPy arrays."""
+    arrays = {}
+    ids = store.ids.tolist()
+    if all(_is_int(i) for i in ids):
+        arrays["ids_int"] = np.asarray(ids, dtype=np.int64)
+    else:
+        arrays["ids_kind"], arrays["ids_int"], arrays["ids_float"], strings = encode_ids(ids)
+        arrays["ids_heap"], arrays["ids_offsets"] = encode_strings(strings)
+    for col in NUMERIC_COLUMNS:
+        arrays[f"num_{col}"] = store.numeric[col]
+    for col in TEXT_COLUMNS:
+        arrays[f"codes_{col}"] = store.codes[col]
+        arrays[f"heap_{col}"], arrays[f"offsets_{col}"] = encode_strings(store.values[col])
+    return arrays
+
+
+def _store_from_arrays(arrays, record=None):
+    if "ids_kind" in arrays:
+        ids = decode_ids(arrays["ids_kind"], arrays["ids_int"], arrays["ids_float"],
+                         decode_strings(arrays["ids_heap"], arrays["ids_offsets"]))
+    else:
+        ids = np.asarray(arrays["ids_int"].tolist(), dtype=object)
+    numeric = {col: arrays[f"num_{col}"] for col in NUMERIC_COLUMNS}
+    codes = {col: arrays[f"codes_{col}"] for col in TEXT_COLUMNS}
+    values = {}
+    for col in TEXT_COLUMNS:
+        strings = decode_strings(arrays[f"heap_{col}"], arrays[f"offsets_{col}"])
+        if col in INTERNED_COLUMNS:
+            strings = [sys.intern(v) for v in strings]
+        values[col] = np.asarray(strings, dtype=object)
+    return ListingStore(ids, numeric, codes, values, record=record)
+
+
+# Cache file
+
+def save_cache(store, csv_path):
+    """Write the store next to its CSV. Written to a temp file first so readers never see half a cache."""
+    meta = dict(_fingerprint(csv_path), format=CACHE_FORMAT)
+    arrays = _store_arrays(store)
+    arrays["meta"] = np.array(json.dumps(meta))
+
+    target = cache_path(csv_path)
+    # A unique temp file per writer, so processes building the cache at once don't clobber each other
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(target)),
+                               prefix=os.path.basename(target), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return target
+
+
+def load_cache(csv_path, record=None):
+    """The cached store for csv_path, or None when missing, unreadable or stale."""
+    path = cache_path(csv_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            if not _cache_is_fresh(meta, csv_path):
+                return None
+            arrays = {name: npz[name] for name in npz.files if name != "meta"}
+        return _store_from_arrays(arrays, record=record)
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+        # Truncated or corrupt: treated as stale, so the caller rebuilds it from the CSV
+        print(f"Ignoring unreadable listings cache {path}: {e}")
+        return None
+
+
+# Memory-mapped store directory
+
+def _write_array(directory, name, array, dtype):
+    np.ascontiguousarray(array, dtype=dtype).tofile(os.path.join(directory, name))
+
+
+def _map_array(directory, name, dtype, length):
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(os.path.join(directory, name), dtype=dtype, mode="r", shape=(length,))
+
+
+class _HeapWriter:
+    """Appends strings to a heap/offsets file pair, optionally deduplicating them."""
+
+    def __init__(self, directory, name, dedupe=True):
+        self.heap = open(os.path.join(directory, f"{name}.heap"), "wb")
+        self.offsets = open(os.path.join(directory, f"{name}.offsets.bin"), "wb")
+        self.codes = {} if dedupe else None
+        self.count = 0
+        self.bytes = 0
+        np.zeros(1, dtype=np.int64).tofile(self.offsets)
+
+    def append(self, values):
+        heap, offsets = encode_strings(values)
+        heap.tofile(self.heap)
+        (offsets[1:] + self.bytes).tofile(self.offsets)
+        self.count += len(values)
+        self.bytes += int(offsets[-1])
+
+    def encode(self, local_codes, local_values):
+        """Translate a batch's dictionary codes into codes of the global dictionary."""
+        remap = np.empty(len(local_values) + 1, dtype=np.int32)
+        remap[-1] = -1
+        new = []
+        for i, value in enumerate(str(v) for v in local_values):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = self.count + len(new)
+                new.append(value)
+            remap[i] = code
+        if new:
+            self.append(new)
+        return remap[local_codes]
+
+    def close(self):
+        self.heap.close()
+        self.offsets.close()
+
+
+def build_store_from_batches(batches, directory):
+    """
+    Write a store directory from an iterable of ListingView batches (for
+    example listings.iter_listing_batches). Only one batch plus the distinct
+    text values are held in memory at a time. meta.json is written last, so a
+    directory without it is an incomplete build.
+    """
+    os.makedirs(directory, exist_ok=True)
+    meta_file = os.path.join(directory, STORE_META)
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+
+    files = {}
+
+    def out(name):
+        if name not in files:
+            files[name] = open(os.path.join(directory, name), "wb")
+        return files[name]
+
+    text = {col: _HeapWriter(directory, col) for col in TEXT_COLUMNS}
+    # Ids are written in both layouts; the tagged one is dropped if every id is an int
+    id_heap = _HeapWriter(directory, "ids", dedupe=False)
+    all_ints, rows = True, 0
+    numeric_dtypes = {col: np.dtype(np.int64 if col == "accommodates" else np.float64) for col in NUMERIC_COLUMNS}
+    try:
+        for batch in batches:
+            store = batch.store
+            kinds, ints, floats, strings = encode_ids(store.ids.tolist())
+            all_ints = all_ints and bool(np.all(kinds == ID_INT))
+            kinds.tofile(out("ids.kind.bin"))
+            ints.tofile(out("ids.bin"))
+            floats.tofile(out("ids.float.bin"))
+            id_heap.append(strings)
+
+            for col in NUMERIC_COLUMNS:
+                np.asarray(store.numeric[col], dtype=numeric_dtypes[col]).tofile(out(f"{col}.bin"))
+            for col in TEXT_COLUMNS:
+                text[col].encode(store.codes[col], store.values[col]).tofile(out(f"{col}.codes.bin"))
+            rows += store.size
+    finally:
+        for f in files.values():
+            f.close()
+        for writer in list(text.values()) + [id_heap]:
+            writer.close()
+
+    id_mode = "int" if all_ints else "mixed"
+    if id_mode == "int":
+        for name in ("ids.kind.bin", "ids.float.bin", "ids.heap", "ids.offsets.bin"):
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+    if rows == 0:
+        open(os.path.join(directory, "ids.bin"), "wb").close()
+
+    # Sort permutations over the finished columns, so opening never re-sorts
+    for col in PRESORTED_COLUMNS:
+        values = _map_array(directory, f"{col}.bin", numeric_dtypes[col], rows)
+        _write_array(directory, f"{col}.asc.bin", np.argsort(values, kind="stable"), np.int32)
+        _write_array(directory, f"{col}.desc.bin", np.argsort(-values, kind="stable"), np.int32)
+        del values
+
+    meta = {
+        "format": STORE_FORMAT,
+        "rows": rows,
+        "ids": id_mode,
+        "numeric": {col: dtype.str for col, dtype in numeric_dtypes.items()},
+        "values": {col: {"count": w.count, "bytes": w.bytes} for col, w in text.items()},
+    }
+    if id_mode == "mixed":
+        meta["ids_bytes"] = id_heap.bytes
+    with open(meta_file, "w") as f:
+        json.dump(meta, f, indent=2)
+    return directory
+
+
+def save_store(store, directory):
+    """Lay an in-memory store out as a memory-mappable directory."""
+    return build_store_from_batches([store.view()], directory)
+
+
+def is_store_dir(path):
+    return os.path.isfile(os.path.join(path, STORE_META))
+
+
+def open_store(directory, record=None):
+    """Memory-map a directory written by save_store()."""
+    with open(os.path.join(directory, STORE_META)) as f:
+        meta = json.load(f)
+    if meta.get("format") != STORE_FORMAT:
+        raise ValueError(f"Unsupported listing store format in {directory}: {meta.get('format')}")
+    n = meta["rows"]
+
+    if meta["ids"] == "int":
+        ids = _map_array(directory, "ids.bin", np.int64, n)
+    else:
+        ids = MixedIds(_map_array(directory, "ids.kind.bin", np.uint8, n),
+                       _map_array(directory, "ids.bin", np.int64, n),
+                       _map_array(directory, "ids.float.bin", np.float64, n),
+                       StringHeap(_map_array(directory, "ids.heap", np.uint8, meta["ids_bytes"]),
+                                  _map_array(directory, "ids.offsets.bin", np.int64, n + 1)))
+    numeric = {col: _map_array(directory, f"{col}.bin", np.dtype(meta["numeric"][col]), n) for col in NUMERIC_COLUMNS}
+    codes, values = {}, {}
+    for col in TEXT_COLUMNS:
+        info = meta["values"][col]
+        codes[col] = _map_array(directory, f"{col}.codes.bin", np.int32, n)
+        values[col] = StringHeap(_map_array(directory, f"{col}.heap", np.uint8, info["bytes"]),
+                                 _map_array(directory, f"{col}.offsets.bin", np.int64, info["count"] + 1))
+
+    store = ListingStore(ids, numeric, codes, values, record=record)
+    for col in PRESORTED_COLUMNS:
+        store.set_sort_permutations(col, _map_array(directory, f"{col}.asc.bin", np.int32, n),
+                                    _map_array(directory, f"{col}.desc.bin", np.int32, n))
+    return store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from listings import iter_listing_batches
+
+    parser = argparse.ArgumentParser(description="Build a memory-mapped listing store from a CSV.")
+    parser.add_argument("csv", help="listings CSV (cleaned, merged or a raw dump)")
+    parser.add_argument("directory", help="output store directory")
+    parser.add_argument("--chunksize", type=int, default=50_000, help="rows parsed per batch")
+    args = parser.parse_args()
+
+    build_store_from_batches(iter_listing_batches(args.csv, chunksize=args.chunksize), args.directory)
+    with open(os.path.join(args.directory, STORE_META)) as f:
+        print(f"Wrote {json.load(f)['rows']} listings to {args.directory}.")
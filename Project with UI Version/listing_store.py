@@ -0,0 +1,581 @@
+# listing_store.py
+import sys
+
+import numpy as np
+import pandas as pd
+
+from catalog_stats import CatalogStats
+from listing_index import (
+    AmenityIndex, BM25Index, GridIndex, PrefixIndex, SortedIndex, TokenIndex, TrigramIndex, extend_buffer,
+)
+
+# Fields every listing record carries, in the order Listing.to_dict() uses.
+LISTING_FIELDS = (
+    "listing_id", "name", "location", "property_type", "accommodates",
+    "amenities", "price", "min_nights", "max_nights", "review_rating", "tags",
+    "latitude", "longitude",
+)
+
+NUMERIC_COLUMNS = ("price", "review_rating", "accommodates", "min_nights", "max_nights", "latitude", "longitude")
+# Optional columns; NaN (returned as None) when the data has no coordinates
+COORDINATE_COLUMNS = ("latitude", "longitude")
+TEXT_COLUMNS = ("name", "location", "property_type", "amenities", "tags")
+
+# Low-cardinality text columns whose distinct values are interned, so every
+# store (original, synthetic, merged) shares one copy of e.g. "entire home".
+INTERNED_COLUMNS = ("location", "property_type")
+
+# Columns whose sort permutations (both directions) are precomputed at load
+PRESORTED_COLUMNS = ("price", "review_rating", "accommodates")
+
+# Same safe defaults load_listings has always used for missing numbers
+COLUMN_DEFAULTS = {"price": 0.0, "review_rating": 3.0, "accommodates": 1}
+
+
+def _encode_text(series, intern=False):
+    """
+    Dictionary-encode a text column: one int32 code per row plus the array of
+    distinct values. Missing values get code -1.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    values = np.asarray(uniques, dtype=object)
+    if intern:
+        values = np.asarray([sys.intern(v) if isinstance(v, str) else v for v in values], dtype=object)
+    return codes.astype(np.int32), values
+
+
+def normalize_listing_id(value):
+    """
+    Canonical form used to key listing ids, so 7, 7.0, "7" and " 7 " all
+    refer to the same listing while ids like "SYN-7" are kept as-is.
+    """
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        value = int(value)
+    text = str(value).strip()
+    if text.endswith(".0") and text[:-2].lstrip("-").isdigit():
+        text = text[:-2]
+    return text
+
+
+def _with_missing_slot(per_value):
+    # Code -1 (missing) indexes the extra trailing slot.
+    return np.append(per_value, np.zeros(1, dtype=per_value.dtype))
+
+
+class ListingStore:
+    """
+    Column-oriented listing catalog.
+
+    Numeric fields are held as NumPy arrays and text fields are dictionary
+    encoded (an int32 code per row plus one array of distinct values), so
+    filters become boolean masks and sorts become argsorts. Listing objects
+    are only built for the rows a caller actually reads.
+    """
+
+    def __init__(self, ids, numeric, codes, values, record=None):
+        self.ids = ids
+        self.numeric = numeric
+        self.codes = codes
+        self.values = values
+        self.record = record or dict
+        self.size = len(ids)
+        # Tombstones: rows deleted (or replaced by an update) since load; None until the first one
+        self.deleted = None
+        self._lowered = {}
+        self._id_index = None
+        self._token_index = None
+        self._amenity_index = None
+        self._prefix_index = None
+        self._trigram_index = None
+        self._bm25_index = None
+        self._spatial_index = None
+        self._stats = None
+        self._sorted_indexes = {}
+        self._permutations = {}
+        # Over-allocated arrays behind columns that rows were appended to (see _append)
+        self._buffers = {}
+        self._value_codes = {}
+
+    @classmethod
+    def from_frame(cls, df, record=None):
+        """Build a store from a DataFrame that already has a listing_id column."""
+        n = len(df)
+        ids = np.asarray(df["listing_id"].tolist() if "listing_id" in df else range(n), dtype=object)
+
+        numeric = {}
+        for col in NUMERIC_COLUMNS:
+            raw = df[col] if col in df else pd.Series(np.nan, index=df.index)
+            values = pd.to_numeric(raw, errors="coerce")
+            if col in COLUMN_DEFAULTS:
+                values = values.fillna(COLUMN_DEFAULTS[col])
+            dtype = np.int64 if col == "accommodates" else np.float64
+            numeric[col] = values.to_numpy(dtype=dtype)
+
+        codes, values = {}, {}
+        for col in TEXT_COLUMNS:
+            if col in df:
+                codes[col], values[col] = _encode_text(df[col], intern=col in INTERNED_COLUMNS)
+            else:
+                codes[col] = np.full(n, -1, dtype=np.int32)
+                values[col] = np.empty(0, dtype=object)
+
+        return cls(ids, numeric, codes, values, record=record)
+
+    @classmethod
+    def from_records(cls, rows, record=None):
+        """Build a store from Listing objects or listing dictionaries."""
+        dicts = [r.to_dict() if hasattr(r, "to_dict") else dict(r) for r in rows]
+        df = pd.DataFrame(dicts, columns=list(LISTING_FIELDS) if not dicts else None)
+        if "listing_id" not in df:
+            df["listing_id"] = range(len(df))
+        return cls.from_frame(df, record=record)
+
+    def view(self):
+        """View of every live (not deleted) row."""
+        if self.deleted is None:
+            return ListingView(self)
+        live = ~self.deleted
+        return ListingView(self, np.flatnonzero(live), members=live)
+
+    def live_rows(self):
+        if self.deleted is None:
+            return np.arange(self.size, dtype=np.intp)
+        return np.flatnonzero(~self.deleted)
+
+    @property
+    def id_index(self):
+        """Hash index from normalized listing_id to store row (first row wins)."""
+        if self._id_index is None:
+            index = {}
+            for row, listing_id in enumerate(self.ids.tolist()):
+                if self.deleted is None or not self.deleted[row]:
+                    index.setdefault(normalize_listing_id(listing_id), row)
+            self._id_index = index
+        return self._id_index
+
+    def row_of(self, listing_id):
+        return self.id_index.get(normalize_listing_id(listing_id))
+
+    def sorted_index(self, column):
+        """Sorted index over a numeric column, built once and reused for range queries."""
+        if column not in self._sorted_indexes:
+            self._sorted_indexes[column] = SortedIndex(self.numeric[column])
+        return self._sorted_indexes[column]
+
+    def has_sorted_index(self, column):
+        return column in self._sorted_indexes
+
+    def sort_permutation(self, column, ascending=True):
+        """
+        Store rows in stable sorted order of a numeric column. Descending keeps
+        equal keys in row order too, matching sorted(..., reverse=True).
+        """
+        key = (column, ascending)
+        if key not in self._permutations:
+            if ascending:
+                self._permutations[key] = self.sorted_index(column).order
+            else:
+                self._permutations[key] = np.argsort(-self.numeric[column], kind="stable").astype(np.int32)
+        return self._permutations[key]
+
+    def set_sort_permutations(self, column, ascending_rows, descending_rows):
+        """Reuse permutations computed elsewhere (e.g. loaded from a store directory)."""
+        self._permutations[(column, True)] = ascending_rows
+        self._permutations[(column, False)] = descending_rows
+        self._sorted_indexes[column] = SortedIndex(self.numeric[column], order=ascending_rows)
+
+    def build_indexes(self):
+        """Build the id, token, trigram, BM25, amenity, prefix, spatial and price indexes and the sort permutations up front."""
+        self.id_index
+        self.token_index
+        self.trigram_index
+        self.bm25_index
+        self.spatial_index
+        self.amenity_index
+        self.prefix_index
+        for column in PRESORTED_COLUMNS:
+            self.sort_permutation(column, True)
+            self.sort_permutation(column, False)
+        return self
+
+    @property
+    def price_index(self):
+        return self.sorted_index("price")
+
+    @property
+    def token_index(self):
+        """Inverted token index over tags, location, property_type and name (built once)."""
+        if self._token_index is None:
+            self._token_index = TokenIndex(self)
+        return self._token_index
+
+    @property
+    def trigram_index(self):
+        """Trigram index over the location, name and tags vocabulary, for fuzzy search (built once)."""
+        if self._trigram_index is None:
+            self._trigram_index = TrigramIndex(self.token_index)
+        return self._trigram_index
+
+    @property
+    def bm25_index(self):
+        """Ranked full-text index over name, tags and amenities (built once)."""
+        if self._bm25_index is None:
+            self._bm25_index = BM25Index(self)
+        return self._bm25_index
+
+    @property
+    def spatial_index(self):
+        """Uniform grid over listing coordinates for radius / bounding-box queries (built once)."""
+        if self._spatial_index is None:
+            self._spatial_index = GridIndex(self.numeric["latitude"], self.numeric["longitude"])
+        return self._spatial_index
+
+    @property
+    def stats(self):
+        """Per-column statistics of the live rows (computed once, then kept up to date)."""
+        if self._stats is None:
+            self._stats = CatalogStats(self)
+        return self._stats
+
+    # Incremental changes
+
+    def append_records(self, rows):
+        """
+        Append listings (Listing objects or dicts) as new store rows and update
+        the indexes that are already built in place: ids, tokens, trigrams,
+        BM25, amenities, prefixes, column statistics, sorted columns and the
+        spatial grid. Columns grow inside over-allocated buffers, so adding
+        one listing does not copy every column. Returns the new rows.
+        """
+        new = ListingStore.from_records(rows)
+        added = np.arange(self.size, self.size + new.size, dtype=np.intp)
+        if not new.size:
+            return added
+        old_numeric = self.numeric
+
+        ids = self.ids if isinstance(self.ids, np.ndarray) else np.asarray(self.ids.tolist(), dtype=object)
+        self.ids = self._append("ids", ids if ids.dtype == object else ids.astype(object), new.ids)
+        self.numeric = {col: self._append(col, old_numeric[col], new.numeric[col]) for col in NUMERIC_COLUMNS}
+        for col in TEXT_COLUMNS:
+            self.codes[col] = self._append(("codes", col), self.codes[col], self._merge_values(col, new, new.codes[col]))
+        self.size += new.size
+        if self.deleted is not None:
+            self.deleted = self._append("deleted", self.deleted, np.zeros(new.size, dtype=bool))
+
+        if self._id_index is not None:
+            for row, listing_id in zip(added.tolist(), new.ids.tolist()):
+                self._id_index[normalize_listing_id(listing_id)] = row
+        if self._token_index is not None:
+            new_tokens = self._token_index.add_rows(self, added)
+            if self._trigram_index is not None:
+                self._trigram_index.add_tokens(new_tokens)
+        if self._amenity_index is not None:
+            self._amenity_index.add_values(self)
+        self._adjust_prefixes(added, +1)
+        if self._stats is not None:
+            self._stats.update(self, added, +1)
+        if self._bm25_index is not None:
+            self._bm25_index.add_rows(self, added)
+        if self._spatial_index is not None:
+            self._spatial_index.lat = self.numeric["latitude"]
+            self._spatial_index.lon = self.numeric["longitude"]
+            if not self._spatial_index.add_rows(added):
+                self._spatial_index = None
+        for column in {c for c, _ in self._permutations} | set(self._sorted_indexes):
+            self._insert_sorted(column, old_numeric[column], added)
+        return added
+
+    def delete_rows(self, rows):
+        """Tombstone rows: views, the id index, prefix counts and column statistics stop seeing them."""
+        rows = np.asarray(rows, dtype=np.intp)
+        if self.deleted is None:
+            self.deleted = np.zeros(self.size, dtype=bool)
+        rows = np.unique(rows[~self.deleted[rows]])
+        self.deleted[rows] = True
+        if self._id_index is not None:
+            for row, listing_id in zip(rows.tolist(), self.ids[rows].tolist()):
+                key = normalize_listing_id(listing_id)
+                if self._id_index.get(key) == row:
+                    del self._id_index[key]
+        self._adjust_prefixes(rows, -1)
+        if self._stats is not None:
+            self._stats.update(self, rows, -1)
+        if self._bm25_index is not None:
+            self._bm25_index.remove_rows(self, rows)
+        return rows
+
+    def _append(self, key, column, added):
+        """
+        column followed by added, as a view of an over-allocated buffer owned
+        by the store: appends write into spare capacity and only reallocate
+        (doubling) when it runs out. Earlier views keep their length and values.
+        """
+        buffer = self._buffers.get(key)
+        if buffer is None or column.base is not buffer:
+            buffer = column  # not one of ours (loaded or memory-mapped): copied on first growth
+        buffer, used = extend_buffer(buffer, len(column), added)
+        self._buffers[key] = buffer
+        return buffer[:used]
+
+    def _merge_values(self, col, other, other_codes):
+        # Recode another store's codes into this store's dictionary, appending unseen values
+        values = self.values[col]
+        if not isinstance(values, np.ndarray):
+            values = np.asarray(values.tolist(), dtype=object)
+        lookup = self._value_codes.get(col)
+        if lookup is None:
+            lookup = self._value_codes[col] = {v: i for i, v in enumerate(values.tolist())}
+        mapping, extra = [], []
+        for value in other.values[col].tolist():
+            if value not in lookup:
+                if col in INTERNED_COLUMNS and isinstance(value, str):
+                    value = sys.intern(value)
+                lookup[value] = len(values) + len(extra)
+                extra.append(value)
+            mapping.append(lookup[value])
+        if extra:
+            values = self._append(("values", col), values, np.asarray(extra, dtype=object))
+            if col in self._lowered:
+                self._lowered[col].extend(str(v).lower() for v in extra)
+        self.values[col] = values
+        # Missing (-1) stays missing
+        return np.append(np.asarray(mapping, dtype=np.int32), np.int32(-1))[other_codes]
+
+    def _adjust_prefixes(self, rows, delta):
+        if self._prefix_index is None:
+            return
+        for field in self._prefix_index.fields:
+            values, codes = self.values[field], self.codes[field]
+            for code in codes[rows].tolist():
+                if code >= 0:
+                    self._prefix_index.adjust(field, values[code], delta)
+
+    def _insert_sorted(self, column, old_values, added):
+        index = self._sorted_indexes.get(column) or SortedIndex(old_values, order=self._permutations.get((column, True)))
+        values = self.numeric[column][added]
+        descending = self._permutations.get((column, False))
+        if descending is not None:
+            # Equal keys keep row order, so new rows go after every existing row >= value
+            by_value = np.argsort(-values, kind="stable")
+            at = len(index.order) - np.searchsorted(index.sorted_values, values[by_value], side="left")
+            self._permutations[(column, False)] = np.insert(descending, at, added[by_value].astype(descending.dtype))
+        index.insert(values, added)
+        self._sorted_indexes[column] = index
+        if (column, True) in self._permutations:
+            self._permutations[(column, True)] = index.order
+
+    # Row materialization
+
+    def records(self, rows):
+        """Build record objects (Listing by default) for the given store rows."""
+        rows = np.asarray(rows, dtype=np.intp)
+        columns = {"listing_id": self.ids[rows].tolist()}
+        for col in NUMERIC_COLUMNS:
+            columns[col] = self.numeric[col][rows].tolist()
+        for col in ("min_nights", "max_nights"):
+            columns[col] = [None if v != v else int(v) for v in columns[col]]
+        for col in COORDINATE_COLUMNS:
+            columns[col] = [None if v != v else v for v in columns[col]]
+        for col in TEXT_COLUMNS:
+            vals = self.values[col]
+            columns[col] = [vals[c] if c >= 0 else None for c in self.codes[col][rows].tolist()]
+
+        names = list(columns)
+        return [self.record(**dict(zip(names, row))) for row in zip(*columns.values())]
+
+    def frame(self, rows):
+        """DataFrame of the given store rows with the usual listing columns."""
+        rows = np.asarray(rows, dtype=np.intp)
+        data = {"listing_id": self.ids[rows]}
+        for col in LISTING_FIELDS[1:]:
+            if col in self.numeric:
+                data[col] = self.numeric[col][rows]
+            else:
+                data[col] = self.take_values(col, self.codes[col][rows])
+        return pd.DataFrame(data)
+
+    def take_values(self, col, codes):
+        """Object array of the text values behind the given codes (None for missing)."""
+        values = self.values[col]
+        if isinstance(values, np.ndarray):
+            return np.append(values, None)[codes]
+        return np.asarray([values[c] if c >= 0 else None for c in codes.tolist()], dtype=object)
+
+    # Masks over every row of the store
+
+    def lowered(self, field):
+        """Lowercased distinct values of a text column, computed once."""
+        if field not in self._lowered:
+            self._lowered[field] = [str(v).lower() for v in self.values[field]]
+        return self._lowered[field]
+
+    def value_mask(self, field, predicate):
+        """Row mask for a text column, evaluating predicate once per distinct value."""
+        lowered = self.lowered(field)
+        hits = np.fromiter((predicate(v) for v in lowered), dtype=bool, count=len(lowered))
+        return _with_missing_slot(hits)[self.codes[field]]
+
+    @property
+    def amenity_index(self):
+        """Amenity vocabulary and bitsets (built once)."""
+        if self._amenity_index is None:
+            self._amenity_index = AmenityIndex(self)
+        return self._amenity_index
+
+    @property
+    def prefix_index(self):
+        """Autocomplete index over locations, property types and names (built once)."""
+        if self._prefix_index is None:
+            self._prefix_index = PrefixIndex(self)
+        return self._prefix_index
+
+    def rows_mask(self, rows):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def keyword_mask(self, keyword, fields):
+        """Rows whose fields contain every token of the keyword (whole tokens, not substrings)."""
+        return self.rows_mask(self.token_index.rows(keyword, fields))
+
+    def contains_mask(self, keyword, fields):
+        keyword = keyword.lower()
+        mask = np.zeros(self.size, dtype=bool)
+        for field in fields:
+            mask |= self.value_mask(field, lambda v: keyword in v)
+        return mask
+
+    def range_mask(self, column, low=None, high=None):
+        values = self.numeric[column]
+        mask = np.ones(self.size, dtype=bool)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
+
+    def sort_key(self, column):
+        """A numeric array whose order matches the column's natural order."""
+        if column in self.numeric:
+            return self.numeric[column]
+        if column in self.codes:
+            # Rank the distinct values once, then look ranks up per row.
+            # Missing values sort first.
+            values = [str(v) for v in self.values[column]]
+            order = sorted(range(len(values)), key=values.__getitem__)
+            ranks = np.empty(len(order) + 1, dtype=np.int64)
+            ranks[order] = np.arange(len(order))
+            ranks[-1] = -1
+            return ranks[self.codes[column]]
+        if column == "listing_id":
+            ids = self.ids.tolist()
+            order = sorted(range(self.size), key=lambda i: (str(type(ids[i])), ids[i]))
+            ranks = np.empty(self.size, dtype=np.int64)
+            ranks[order] = np.arange(self.size)
+            return ranks
+        return None
+
+
+class ListingView:
+    """
+    An ordered selection of rows from a ListingStore.
+
+    Behaves like a read-only list of Listing objects (len, iteration, indexing
+    and slicing all work) so existing callers keep working, but filtering and
+    sorting happen on the underlying columns.
+    """
+
+    _CHUNK = 512
+
+    def __init__(self, store, rows=None, ordered=False, members=None):
+        self.store = store
+        self._rows = rows
+        # False while rows are in ascending store order (fresh or filtered views)
+        self.ordered = ordered
+        # Store-wide mask of the rows in this view, built on the first find()
+        self._members = members
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            return np.arange(self.store.size, dtype=np.intp)
+        return self._rows
+
+    def __len__(self):
+        return self.store.size if self._rows is None else len(self._rows)
+
+    def __iter__(self):
+        rows = self.rows
+        for start in range(0, len(rows), self._CHUNK):
+            yield from self.store.records(rows[start:start + self._CHUNK])
+
+    def __getitem__(self, index):
+        rows = self.rows
+        if isinstance(index, slice):
+            return self.store.records(rows[index])
+        return self.store.records(rows[[index]])[0]
+
+    def __repr__(self):
+        return f"<ListingView {len(self)} of {self.store.size} listings>"
+
+    def find(self, listing_id):
+        """The record with this listing_id if it is part of the view, else None."""
+        row = self.store.row_of(listing_id)
+        if row is None:
+            return None
+        if self._rows is not None:
+            if self._members is None:
+                self._members = self.store.rows_mask(self._rows)
+            # Rows appended after the view was taken are past the end of the mask
+            if row >= len(self._members) or not self._members[row]:
+                return None
+        return self.store.records([row])[0]
+
+    def to_list(self):
+        return self.store.records(self.rows)
+
+    def column(self, name):
+        return self.store.numeric[name][self.rows]
+
+    def restrict(self, store_rows):
+        """Keep the rows of this view that are in a candidate set of store rows."""
+        if self._rows is None:
+            return ListingView(self.store, np.sort(store_rows))
+        return self.where(self.store.rows_mask(store_rows))
+
+    def where(self, store_mask):
+        """Keep the rows of this view whose entry in a store-wide mask is True."""
+        rows = self.rows
+        return ListingView(self.store, rows[store_mask[rows]], self.ordered)
+
+    def rank(self, store_rows, scores):
+        """
+        Order this view by scores given for a sorted array of store rows, best
+        first; equal scores keep the current order, unscored rows go last.
+        """
+        rows = self.rows
+        pos = np.minimum(np.searchsorted(store_rows, rows), max(0, len(store_rows) - 1))
+        found = np.zeros(len(rows), dtype=bool)
+        if len(store_rows):
+            found = store_rows[pos] == rows
+        keyed = np.where(found, scores[pos] if len(store_rows) else 0.0, -np.inf)
+        return ListingView(self.store, rows[np.argsort(-keyed, kind="stable")], ordered=True)
+
+    def order_by(self, column, ascending=True):
+        """Stable sort of this view by a column (equal keys keep their order)."""
+        store = self.store
+        if column in PRESORTED_COLUMNS and not self.ordered:
+            # Walk the precomputed permutation and keep the rows in this view:
+            # a linear pass, no sorting.
+            perm = store.sort_permutation(column, ascending)
+            if self._rows is None:
+                return ListingView(store, perm, ordered=True)
+            return ListingView(store, perm[store.rows_mask(self._rows)[perm]], ordered=True)
+
+        key = store.sort_key(column)
+        if key is None:
+            return self
+        rows = self.rows
+        values = key[rows]
+        order = np.argsort(values if ascending else -values, kind="stable")
+        return ListingView(store, rows[order], ordered=True)
@@ -1,17 +1,35 @@
 # listings.py
 import pandas as pd
+import numpy as np
 import os
 
-Listings_File = os.path.join(
+from listing_store import ListingStore, ListingView
+from listing_storage import cache_path, is_store_dir, load_cache, open_store, save_cache
+from query_planner import plan_query
+from catalog_stats import facet_counts
+from listing_catalog import delta_path, read_delta, replay_delta
+
+# LISTINGS_FILE in the environment points the app at another CSV or store directory
+Listings_File = os.environ.get("LISTINGS_FILE") or os.path.join(
     os.path.dirname(__file__),  # Current file directory (src/)
-    "..",                       # Go up one level (to project root)                   # Go into data folder
+    "..",                       # Go up one level (to project root)
+    "CLI Version", "data",      # Go into data folder
     "cleaned_listings.csv"      # Your dataset
 )
 
 class Listing:
+    # No per-instance __dict__; text fields built from a ListingStore share
+    # the store's dictionary-encoded (and interned) string objects.
+    __slots__ = (
+        "listing_id", "name", "location", "property_type", "accommodates",
+        "amenities", "price", "min_nights", "max_nights", "review_rating", "tags",
+        "latitude", "longitude",
+    )
+
     def __init__(self, name, location, property_type, accommodates,
                  amenities, price, min_nights, max_nights,
-                 review_rating, tags, listing_id): # Removed type hint to be more flexible
+                 review_rating, tags, listing_id,
+                 latitude=None, longitude=None): # Removed type hint to be more flexible
         self.listing_id = listing_id
         self.name = name
         self.location = location
@@ -23,6 +41,9 @@ class Listing:
         self.max_nights = max_nights
         self.review_rating = review_rating
         self.tags = tags
+        # Optional coordinates (None when the dataset has none)
+        self.latitude = latitude
+        self.longitude = longitude
     
     def to_dict(self):
         return {
@@ -36,16 +57,16 @@ class Listing:
             "min_nights": self.min_nights,
             "max_nights": self.max_nights,
             "review_rating": self.review_rating,
-            "tags": self.tags
+            "tags": self.tags,
+            "latitude": self.latitude,
+            "longitude": self.longitude
         }
 
-def load_listings(filename=Listings_File):
-    if not os.path.exists(filename):
-        print(f"Error: {filename} not found.")
-        return []
-    
-    df = pd.read_csv(filename)
-    
+def _standardize_columns(df, row_offset=0):
+    """
+    Standardize id, price and name columns in place. Used for a whole file or,
+    when streaming, for each chunk (row_offset keeps fallback ids unique).
+    """
     # Standardize the ID column. 
     id_col_found = None
     if 'listing_id' in df.columns:
@@ -64,43 +85,100 @@ def load_listings(filename=Listings_File):
     
     if price_col_found and price_col_found != 'price':
         df.rename(columns={price_col_found: 'price'}, inplace=True)
+
+    # Optional coordinates under their common alternative names
+    for alt, col in (('lat', 'latitude'), ('lng', 'longitude'), ('lon', 'longitude')):
+        if alt in df.columns and col not in df.columns:
+            df.rename(columns={alt: col}, inplace=True)
+
+    # Use the ID from the file if we found one, otherwise fall back to the row index
+    if not id_col_found:
+        df['listing_id'] = range(row_offset, row_offset + len(df))
+    if 'name' not in df.columns:
+        df['name'] = "Unnamed Listing"
+    return df
+
+
+def load_listings(filename=Listings_File, use_cache=True):
+    if not os.path.exists(filename):
+        print(f"Error: {filename} not found.")
+        return ListingStore.from_records([], record=Listing).view()
+
+    # A store directory (see listing_storage.py) is memory-mapped, not loaded;
+    # heavier indexes are then built lazily on first use
+    if os.path.isdir(filename) and is_store_dir(filename):
+        listings = open_store(filename, record=Listing).view()
+        print(f"Opened memory-mapped store with {len(listings)} listings at {filename}.")
+        return listings
+
+    # A binary cache next to the CSV skips parsing entirely while the CSV's
+    # size, mtime and content hash still match
+    if use_cache:
+        store = load_cache(filename, record=Listing)
+        if store is not None:
+            store.build_indexes()
+            print(f"Loaded {store.size} listings from cache {cache_path(filename)}.")
+            return _apply_delta(store, filename)
     
-    # Fill any potential missing values (NaN) with safe defaults
-    df['price'] = pd.to_numeric(df.get('price'), errors='coerce').fillna(0.0)
-    df['review_rating'] = pd.to_numeric(df.get('review_rating'), errors='coerce').fillna(3.0)
-    df['accommodates'] = pd.to_numeric(df.get('accommodates'), errors='coerce').fillna(1)
-    
+    df = _standardize_columns(pd.read_csv(filename))
 
-    # Convert the cleaned DataFrame to a list of Listing objects
-    listings = []
-    for i, row in enumerate(df.to_dict(orient='records')):
-        # Use the ID from the file if we found one, otherwise fall back to the row index
-        listing_id = row.get('listing_id') if id_col_found else i
-        
-        listings.append(Listing(
-            listing_id=listing_id,
-            name=row.get("name", "Unnamed Listing"),
-            location=row.get("location"),
-            property_type=row.get("property_type"),
-            accommodates=row.get("accommodates"),
-            amenities=row.get("amenities"),
-            price=row.get("price"),
-            min_nights=row.get("min_nights"),
-            max_nights=row.get("max_nights"),
-            review_rating=row.get("review_rating"),
-            tags=row.get("tags")
-        ))
+    # The store fills missing numbers with safe defaults and keeps every
+    # column as a NumPy array; Listing objects are only built on access.
+    # Indexes and sort permutations are built once here, not per request.
+    store = ListingStore.from_frame(df, record=Listing).build_indexes()
         
-    print(f"Loaded and standardized {len(listings)} listings from {filename}.")
-    return listings
+    print(f"Loaded and standardized {store.size} listings from {filename}.")
+
+    if use_cache:
+        try:
+            save_cache(store, filename)
+        except OSError as e:
+            print(f"Could not write listings cache for {filename}: {e}")
+    return _apply_delta(store, filename)
+
+
+def _apply_delta(store, filename):
+    # Changes made through ListingCatalog since the last compaction (the cache holds the base file only)
+    entries = read_delta(delta_path(filename))
+    if entries:
+        replay_delta(store, entries)
+        print(f"Applied {len(entries)} logged listing changes from {delta_path(filename)}.")
+    return store.view()
+
+
+def iter_listing_batches(filename=Listings_File, chunksize=50_000):
+    """
+    Stream a listings CSV in chunks, yielding one columnar ListingView per
+    chunk. Each chunk gets the same id/price standardization as load_listings,
+    and peak memory is bounded by the chunk size instead of the file size.
+    """
+    offset = 0
+    for chunk in pd.read_csv(filename, chunksize=chunksize):
+        chunk = _standardize_columns(chunk, row_offset=offset)
+        offset += len(chunk)
+        yield ListingStore.from_frame(chunk, record=Listing).view()
+
+
+def stream_listings(filename=Listings_File, chunksize=50_000):
+    """Yield Listing objects one at a time from a CSV of any size."""
+    for batch in iter_listing_batches(filename, chunksize=chunksize):
+        yield from batch
+
+
+def listings_from_records(rows):
+    """Wrap Listing objects or listing dictionaries in a columnar view."""
+    return ListingStore.from_records(rows, record=Listing).view()
+
+
+def _as_view(listings):
+    if isinstance(listings, ListingView):
+        return listings
+    return listings_from_records(listings)
 
 def find_listing_by_id(listings, listing_id):
-    # Convert both to string for safe comparison
-    str_listing_id = str(listing_id)
-    for l in listings:
-        if str(l.listing_id) == str_listing_id:
-            return l
-    return None
+    # O(1) lookup through the store's id index. Ids are compared in
+    # normalized form, so 7, "7" and 7.0 all find the same listing.
+    return _as_view(listings).find(listing_id)
 
 
 
@@ -123,43 +201,78 @@ def view_listings(listings, limit=5):
 
 # Filter Functions
 
-def find_listing_by_id(listings, listing_id: int):
-    for l in listings:
-        if l.listing_id == listing_id:
-            return l
-    return None
+def filter_by_keyword(listings, keyword, fields=("tags", "location"), fuzzy=False):
+    # Token-aware lookup in the store's inverted index: "lake" matches the
+    # tag "lake" but no longer the neighbourhood "blakely".
+    listings = _as_view(listings)
+    if fuzzy:
+        # Typo-tolerant: "brookhavn" still finds "brookhaven-amesbury"
+        rows, _ = listings.store.trigram_index.rows(keyword, fields)
+        return listings.restrict(rows)
+    return listings.where(listings.store.keyword_mask(keyword, fields))
 
 def filter_by_environment(listings, environment):
 
-    environment = environment.lower()
-    return [
-        listing for listing in listings
-        if environment in str(listing.tags).lower() or environment in str(listing.location).lower()
-    ]
+    return filter_by_keyword(listings, environment, fields=("tags", "location"))
 
 def filter_by_budget(listings, min_price, max_price):
     
-    return [
-        listing for listing in listings
-        if min_price <= listing.price <= max_price
-    ]
+    # Binary search in the sorted price index; either bound may be None
+    listings = _as_view(listings)
+    return listings.restrict(listings.store.price_index.range_rows(min_price, max_price))
+
+def filter_by_amenities(listings, amenities):
+    """
+    Keep listings that have every must-have amenity, e.g. ["wifi", "free parking", "kitchen"]
+    (a comma-separated string works too). Evaluated on packed amenity bitsets.
+    """
+    if isinstance(amenities, str):
+        amenities = amenities.split(",")
+    amenities = [a for a in (a.strip() for a in amenities) if a]
+    listings = _as_view(listings)
+    if not amenities:
+        return listings
+    return listings.where(listings.store.amenity_index.row_mask(amenities))
 
 def search_by_location(listings, location_preference):
     
-    location_preference = location_preference.lower()
-    return [
-        listing for listing in listings
-        if location_preference in listing.location.lower()
-    ]
+    # Substring test once per distinct location, not once per listing
+    listings = _as_view(listings)
+    return listings.where(listings.store.contains_mask(location_preference, ("location",)))
 
 def search_by_property_type(listings, property_type_perference):
     
-    property_type_perference = property_type_perference.lower()
+    listings = _as_view(listings)
+    return listings.where(listings.store.contains_mask(property_type_perference, ("property_type",)))
+
+def search_listings(listings, query):
+    """
+    BM25-ranked full-text search over name, tags and amenities.
+    Returns (listings matching any query word, best first; their scores in the same order).
+    """
+    listings = _as_view(listings)
+    rows, scores = listings.store.bm25_index.search(query)
+    ranked = listings.restrict(rows).rank(rows, scores)
+    return ranked, scores[np.searchsorted(rows, ranked.rows)]
+
+def rank_by_relevance(listings, query):
+    """Order listings by BM25 score for query; listings matching no query word go last."""
+    listings = _as_view(listings)
+    return listings.rank(*listings.store.bm25_index.search(query))
+
+def suggest(listings, prefix, limit=10, fields=None):
+    """Autocomplete: [{"field", "value", "count"}] for values starting with prefix."""
+    store = _as_view(listings).store
     return [
-        listing for listing in listings
-        if property_type_perference in listing.property_type.lower()
+        {"field": field, "value": value, "count": count}
+        for field, value, count in store.prefix_index.complete(prefix, limit=limit, fields=fields)
     ]
 
+def facets(listings, top=10):
+    """Facet counts (property_type, location, price bucket, accommodates, tags) over the listings."""
+    listings = _as_view(listings)
+    return facet_counts(listings.store, listings.rows, top=top)
+
 # This function sorts listings with attribute chosen by user.
 # It uses a built-in sorted() with a key function to get the attribute from each listing.
 # The reverse=not ascending means descending if ascending=False.
@@ -184,20 +297,15 @@ def sort_listings(listings, by_what="price", ascending=True, user=None):
         print(f"Invalid sort key. Choose from: {', '.join(valid_sort_keys)}")
         return listings
 
- 
-    filtered_listings = listings
+    filtered_listings = _as_view(listings)
     if user:
-        filtered_listings = [
-            l for l in listings
-            if user.budget_min <= l.price <= user.budget_max
-            and l.accommodates >= user.group_size
-        ]
-
-  
-    sorted_list = sorted(
-        filtered_listings, key=lambda l: getattr(l, by_what), reverse=not ascending
-    )
-    return sorted_list
+        store = filtered_listings.store
+        filtered_listings = filtered_listings.where(
+            store.range_mask("price", user.budget_min, user.budget_max)
+            & store.range_mask("accommodates", user.group_size)
+        )
+
+    return filtered_listings.order_by(by_what, ascending=ascending)
 
 
 def get_listing_details(listings, index):
@@ -215,23 +323,40 @@ def get_listing_details(listings, index):
 
 
 def filter_combined(listings, environment=None, min_price=None, max_price=None, min_accommodates=None):
-    filtered = listings
-
-    if environment:
-        filtered = filter_by_environment(filtered, environment)
-    if min_price is not None and max_price is not None:
-        filtered = filter_by_budget(filtered, min_price, max_price)
-    if min_accommodates is not None:
-        filtered = filter_by_accommodates(filtered, min_accommodates)
-
+    # Budget only applies when both bounds are given (as before)
+    if min_price is None or max_price is None:
+        min_price = max_price = None
+    filtered, _ = filter_planned(listings, environment=environment, min_price=min_price,
+                                 max_price=max_price, min_accommodates=min_accommodates)
     return filtered
 
+def filter_planned(listings, environment=None, fields=("tags", "location"), min_price=None, max_price=None,
+                   min_accommodates=None, amenities=None, fuzzy=False, near=None, bbox=None):
+    """
+    Apply all filters in one planned pass: the most selective predicate picks
+    candidate rows from its index, the rest are checked on those rows only.
+    Returns (filtered view, plan); plan.explain() describes what was done.
+    """
+    listings = _as_view(listings)
+    plan = plan_query(listings.store, environment=environment, fields=fields, min_price=min_price,
+                      max_price=max_price, min_accommodates=min_accommodates, amenities=amenities,
+                      fuzzy=fuzzy, near=near, bbox=bbox)
+    return listings.restrict(plan.execute()), plan
+
+def filter_by_radius(listings, lat, lon, radius_km):
+    # Grid cells around the point give the candidates; distance is checked on those only
+    listings = _as_view(listings)
+    rows, _ = listings.store.spatial_index.radius_rows(lat, lon, radius_km)
+    return listings.restrict(rows)
+
+def filter_by_bbox(listings, south, west, north, east):
+    listings = _as_view(listings)
+    return listings.restrict(listings.store.spatial_index.bbox_rows(south, west, north, east))
+
 def filter_by_accommodates(listings, min_accommodates):
 
-    return [
-        listing for listing in listings
-        if listing.accommodates >= min_accommodates
-    ]
+    listings = _as_view(listings)
+    return listings.where(listings.store.range_mask("accommodates", min_accommodates))
 
 
 
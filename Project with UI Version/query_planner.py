@@ -0,0 +1,229 @@
+# query_planner.py
+"""
+A small cost-based planner for combined listing filters.
+
+Every predicate can estimate how many rows it keeps from the store's indexes
+and column statistics (posting-list lengths, binary searches in the sorted
+indexes or column histograms, amenity document frequencies). The most selective predicate drives the query and
+produces a candidate row set from its index. All other predicates are then
+checked on those candidates only, in one pass, so no intermediate lists of
+listings are built.
+"""
+import numpy as np
+
+from listing_index import tokenize
+
+
+class KeywordPredicate:
+    """Every token of the keyword appears in one of the fields (token index)."""
+
+    def __init__(self, keyword, fields):
+        self.keyword = keyword
+        self.fields = tuple(fields)
+        self._rows = None
+
+    def describe(self):
+        return f"keyword {self.keyword!r} in {'/'.join(self.fields)}"
+
+    def estimate(self, store):
+        postings = store.token_index.postings
+        sizes = [
+            sum(len(postings.get(f, {}).get(token, ())) for f in self.fields)
+            for token in set(tokenize(self.keyword))
+        ]
+        return min(min(sizes, default=0), store.stats.rows)
+
+    def rows(self, store):
+        if self._rows is None:
+            self._rows = store.token_index.rows(self.keyword, self.fields)
+        return self._rows
+
+    def check(self, store, rows):
+        return np.isin(rows, self.rows(store), assume_unique=True)
+
+
+class FuzzyKeywordPredicate(KeywordPredicate):
+    """Every word of the keyword approximately matches a token (trigram index); carries similarity scores."""
+
+    def __init__(self, keyword, fields):
+        super().__init__(keyword, fields)
+        self.scores = None
+
+    def describe(self):
+        return f"fuzzy keyword {self.keyword!r} in {'/'.join(self.fields)}"
+
+    def estimate(self, store):
+        # Fuzzy candidates come from the trigram index and are cheap to get exactly
+        return len(self.rows(store))
+
+    def rows(self, store):
+        if self._rows is None:
+            self._rows, self.scores = store.trigram_index.rows(self.keyword, self.fields)
+        return self._rows
+
+
+class RangePredicate:
+    """low <= column <= high (sorted index); either bound may be None."""
+
+    def __init__(self, column, low=None, high=None):
+        self.column = column
+        self.low = low
+        self.high = high
+
+    def describe(self):
+        low = "-inf" if self.low is None else self.low
+        high = "inf" if self.high is None else self.high
+        return f"{self.column} in [{low}, {high}]"
+
+    def estimate(self, store):
+        # Exact count once the sorted index exists; otherwise the histogram avoids building it just to plan
+        if store.has_sorted_index(self.column):
+            return store.sorted_index(self.column).count(self.low, self.high)
+        return store.stats.column(self.column).estimate_range(self.low, self.high)
+
+    def rows(self, store):
+        return store.sorted_index(self.column).range_rows(self.low, self.high)
+
+    def check(self, store, rows):
+        values = store.numeric[self.column][rows]
+        keep = np.ones(len(rows), dtype=bool)
+        if self.low is not None:
+            keep &= values >= self.low
+        if self.high is not None:
+            keep &= values <= self.high
+        return keep
+
+
+class NearPredicate:
+    """Within radius_km of a point (grid spatial index; exact distance on grid candidates only)."""
+
+    def __init__(self, lat, lon, radius_km):
+        self.lat = lat
+        self.lon = lon
+        self.radius_km = radius_km
+        self._rows = None
+
+    def describe(self):
+        return f"within {self.radius_km} km of ({self.lat}, {self.lon})"
+
+    def estimate(self, store):
+        return len(self.rows(store))
+
+    def rows(self, store):
+        if self._rows is None:
+            self._rows, _ = store.spatial_index.radius_rows(self.lat, self.lon, self.radius_km)
+        return self._rows
+
+    def check(self, store, rows):
+        return np.isin(rows, self.rows(store), assume_unique=True)
+
+
+class BoxPredicate(NearPredicate):
+    """Inside a (south, west, north, east) bounding box (grid spatial index)."""
+
+    def __init__(self, south, west, north, east):
+        self.box = (south, west, north, east)
+        self._rows = None
+
+    def describe(self):
+        return "inside box (south {}, west {}, north {}, east {})".format(*self.box)
+
+    def rows(self, store):
+        if self._rows is None:
+            self._rows = store.spatial_index.bbox_rows(*self.box)
+        return self._rows
+
+
+class AmenityPredicate:
+    """Listing has every must-have amenity (amenity bitsets)."""
+
+    def __init__(self, amenities):
+        self.amenities = list(amenities)
+
+    def describe(self):
+        return f"amenities include {', '.join(self.amenities)}"
+
+    def estimate(self, store):
+        # Independence assumption across amenities
+        index = store.amenity_index
+        counts = index.row_counts
+        live = store.stats.rows
+        estimate = float(live)
+        for amenity in self.amenities:
+            matched = sum(counts[i] for i in index.resolve(amenity))
+            estimate *= min(1.0, matched / live) if live else 0.0
+        return int(round(estimate))
+
+    def rows(self, store):
+        return np.flatnonzero(store.amenity_index.row_mask(self.amenities))
+
+    def check(self, store, rows):
+        index = store.amenity_index
+        return index.value_mask(self.amenities)[index.codes[rows]]
+
+
+class QueryPlan:
+    """Predicates ordered by estimated row count, cheapest (most selective) first."""
+
+    def __init__(self, store, predicates):
+        self.store = store
+        estimated = [(p.estimate(store), i, p) for i, p in enumerate(predicates)]
+        estimated.sort(key=lambda t: (t[0], t[1]))
+        self.steps = [(estimate, p) for estimate, _, p in estimated]
+        self.rows_out = None
+
+    @property
+    def similarity(self):
+        """(rows, scores) of a fuzzy keyword predicate, for ranking; None without one."""
+        for _, predicate in self.steps:
+            if isinstance(predicate, FuzzyKeywordPredicate):
+                return predicate.rows(self.store), predicate.scores
+        return None
+
+    def execute(self):
+        """Matching store rows in ascending order."""
+        if not self.steps:
+            rows = np.arange(self.store.size, dtype=np.intp)
+        else:
+            _, driver = self.steps[0]
+            rows = driver.rows(self.store)
+            keep = np.ones(len(rows), dtype=bool)
+            for _, predicate in self.steps[1:]:
+                if not keep.any():
+                    break
+                keep &= predicate.check(self.store, rows)
+            rows = rows[keep]
+        self.rows_out = len(rows)
+        return rows
+
+    def explain(self):
+        """The chosen plan, for debugging (e.g. /api/listings?explain=1)."""
+        steps = [
+            {"predicate": p.describe(), "estimated_rows": int(estimate),
+             "access": "index scan" if i == 0 else "filter candidates"}
+            for i, (estimate, p) in enumerate(self.steps)
+        ]
+        return {"rows_in": self.store.stats.rows, "steps": steps, "rows_out": self.rows_out}
+
+
+def plan_query(store, environment=None, fields=("tags", "location"), min_price=None, max_price=None,
+               min_accommodates=None, amenities=None, fuzzy=False, near=None, bbox=None):
+    """
+    Build a plan for the usual listing filters; arguments left as None are not applied.
+    near is (lat, lon, radius_km); bbox is (south, west, north, east).
+    """
+    predicates = []
+    if environment:
+        keyword = FuzzyKeywordPredicate if fuzzy else KeywordPredicate
+        predicates.append(keyword(environment, fields))
+    if min_price is not None or max_price is not None:
+        predicates.append(RangePredicate("price", min_price, max_price))
+    if min_accommodates is not None:
+        predicates.append(RangePredicate("accommodates", min_accommodates))
+    if amenities:
+        predicates.append(AmenityPredicate(amenities))
+    if near is not None:
+        predicates.append(NearPredicate(*near))
+    if bbox is not None:
+        predicates.append(BoxPredicate(*bbox))
+    return QueryPlan(store, predicates)
@@ -1,13 +1,194 @@
 # recommender.py
+import threading
+from collections import defaultdict
+
 import pandas as pd
 import numpy as np
 
-def get_recommendations(user, listings, top_n=5, weights=None):
+from listing_index import haversine_km, tokenize
+
+# Text fields searched for the user's preferred environment
+ENVIRONMENT_FIELDS = ("tags", "location", "property_type")
+
+# Environments users usually ask for; their match bitmaps are built with the features
+COMMON_ENVIRONMENTS = ("beach", "lake", "mountain", "city", "countryside", "forest", "downtown", "waterfront")
+# Other environments are matched on first use and cached, up to this many
+ENVIRONMENT_CACHE_LIMIT = 256
+
+
+class ListingFeatures:
+    """
+    The user-independent half of get_recommendations for one dataset: price,
+    rating and accommodates already coerced to numbers, per-environment match
+    bitmaps over the tokenized tags / location / property_type, and
+    coordinates for radius filters. Requests only add the user-specific
+    arithmetic on top.
+    """
+
+    def __init__(self, listings):
+        if hasattr(listings, "store"):
+            # Columnar catalog: numbers are already coerced and the token index covers the text
+            store = listings.store
+            rows = np.asarray(listings.rows, dtype=np.intp)
+            rows = rows[pd.notna(store.ids[rows])]
+            self.store, self.rows, self.frame = store, rows, None
+            self.price = store.numeric["price"][rows]
+            self.rating = store.numeric["review_rating"][rows]
+            self.accommodates = store.numeric["accommodates"][rows]
+            self.postings = None
+            self.latitude, self.longitude = store.numeric["latitude"][rows], store.numeric["longitude"][rows]
+        else:
+            # Convert list of dictionaries to a DataFrame for robust processing
+            df = pd.DataFrame(listings)
+            if "listing_id" not in df.columns:
+                df = df.iloc[0:0]  # Cannot proceed without IDs
+
+            # Data Cleaning and Type Coercion Layer
+            # Clean and validate numeric columns
+            for col in ["price", "review_rating", "accommodates"]:
+                df[col] = pd.to_numeric(df[col], errors="coerce") if col in df else np.nan # Invalid values become NaN
+
+            # Fill NaN values with safe defaults
+            df["price"] = df["price"].fillna(0.0)
+            df["review_rating"] = df["review_rating"].fillna(3.0) # Use a neutral rating for missing ones
+            df["accommodates"] = df["accommodates"].fillna(1)
+
+            # Clean and validate text columns
+            for col in ENVIRONMENT_FIELDS:
+                df[col] = df[col].fillna("").astype(str) if col in df else "" # Missing text becomes an empty string
+
+            # Drop rows with invalid IDs
+            if "listing_id" in df.columns:
+                df = df.dropna(subset=["listing_id"])
+            self.store, self.rows, self.frame = None, None, df.reset_index(drop=True)
+            self.price = self.frame["price"].to_numpy(dtype=np.float64)
+            self.rating = self.frame["review_rating"].to_numpy(dtype=np.float64)
+            self.accommodates = self.frame["accommodates"].to_numpy()
+            # Token -> positions over the environment fields, tokenizing each listing once
+            postings = defaultdict(list)
+            for position, parts in enumerate(zip(*(self.frame[f].tolist() for f in ENVIRONMENT_FIELDS))):
+                for token in set(tokenize(" ".join(parts))):
+                    postings[token].append(position)
+            self.postings = {token: np.asarray(p, dtype=np.intp) for token, p in postings.items()}
+            self.latitude = self.longitude = None
+            if "latitude" in self.frame and "longitude" in self.frame:
+                coords = self.frame[["latitude", "longitude"]].apply(pd.to_numeric, errors="coerce")
+                self.latitude, self.longitude = coords["latitude"].to_numpy(), coords["longitude"].to_numpy()
+
+        self.size = len(self.price)
+        self._environments = {}
+        for environment in COMMON_ENVIRONMENTS:
+            self.environment_match(environment)
+
+    def within(self, near):
+        """Mask of listings within radius_km of (lat, lon, radius_km)."""
+        lat, lon, radius_km = near
+        if self.store is not None:
+            # Grid spatial index: distances are only computed for nearby cells
+            return np.isin(self.rows, self.store.spatial_index.radius_rows(lat, lon, radius_km)[0])
+        if self.latitude is None:
+            return np.zeros(self.size, dtype=bool)
+        return haversine_km(lat, lon, self.latitude, self.longitude) <= radius_km
+
+    def in_budget(self, low, high):
+        """Mask of listings priced within [low, high]."""
+        if self.store is not None:
+            # Sorted price index: two binary searches find the rows in the range
+            hits = np.zeros(len(self.store.ids), dtype=bool)
+            hits[self.store.price_index.range_rows(low, high)] = True
+            return hits[self.rows]
+        return (self.price >= low) & (self.price <= high)
+
+    def environment_match(self, environment):
+        """
+        Bitmap of listings whose tags, location or property_type contain every
+        word of the environment as a whole token ("lake" no longer matches
+        "blakely"). Computed once per environment and shared by all users.
+        """
+        tokens = tuple(sorted(set(tokenize(environment))))
+        match = self._environments.get(tokens)
+        if match is not None:
+            return match
+        match = np.zeros(self.size, dtype=bool)
+        if tokens and self.store is not None:
+            match = np.isin(self.rows, self.store.token_index.rows(" ".join(tokens), ENVIRONMENT_FIELDS))
+        elif tokens:
+            match[:] = True
+            for token in tokens:
+                hits = np.zeros(self.size, dtype=bool)
+                hits[self.postings.get(token, [])] = True
+                match &= hits
+        if len(self._environments) < ENVIRONMENT_CACHE_LIMIT:
+            self._environments[tokens] = match
+        return match
+
+    def records(self, positions, scores=None):
+        """Output dictionaries (listing fields plus score, when given) for the chosen positions."""
+        if self.store is not None:
+            frame = self.store.frame(self.rows[positions])
+            for col in ENVIRONMENT_FIELDS:
+                frame[col] = frame[col].fillna("").astype(str)
+        else:
+            frame = self.frame.iloc[positions].copy()
+        if scores is not None:
+            frame["score"] = scores
+        return frame.to_dict(orient="records")
+
+
+class FeatureCache:
+    """Features of the most recent dataset version (one entry; versions only move forward)."""
+
+    def __init__(self):
+        self._version = None
+        self._features = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, listings, version):
+        with self._lock:
+            if self._features is None or self._version != version:
+                self._features = ListingFeatures(listings)
+                self._version = version
+                self.builds += 1
+            return self._features
+
+    def clear(self):
+        with self._lock:
+            self._features = self._version = None
+
+
+FEATURE_CACHE = FeatureCache()
+
+
+def top_k(score, rating, k):
+    """
+    Positions of the k best entries, ordered by score then rating (both
+    descending), ties keeping position order, NaN scores last - the order a
+    full sort_values(["score", "review_rating"], ascending=False) gives. A
+    partition finds the k-th best score in linear time; only the entries
+    reaching it are sorted.
+    """
+    n = len(score)
+    k = min(max(int(k), 0), n)
+    if not k:
+        return np.empty(0, dtype=np.intp)
+    key = np.where(np.isnan(score), -np.inf, score)
+    candidates = np.arange(n)
+    if k < n:
+        cutoff = -np.partition(-key, k - 1)[k - 1]
+        candidates = np.flatnonzero(key >= cutoff)
+    return candidates[np.lexsort((-rating[candidates], -key[candidates]))[:k]]
+
+
+def get_recommendations(user, listings, top_n=5, weights=None, near=None, version=None):
     """
     Recommend top-N listings based on user's preferences and budget.
-    
+
     This robust version accepts user as a dictionary and listings as a list of dictionaries.
     It internally handles data cleaning and validation, making it resilient to messy data.
+    near=(lat, lon, radius_km) keeps only listings within that distance.
+    version identifies the dataset (it must change whenever the listings do);
+    with it the prepared listing features are reused across calls.
     """
     if weights is None:
         weights = dict(price=40.0, env=30.0, rating=30.0)
@@ -16,60 +197,36 @@ def get_recommendations(user, listings, top_n=5, weights=None):
         print("No listings available.")
         return []
 
-    # Convert list of dictionaries to a DataFrame for robust processing
-    df = pd.DataFrame(listings)
-
-    # If the dataframe is empty after creation, exit early.
-    if df.empty:
-        return []
-
-    # Data Cleaning and Type Coercion Layer
-    # Clean and validate numeric columns
-    for col in ["price", "review_rating", "accommodates"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce") # Invalid values become NaN
-    
-    # Fill NaN values with safe defaults
-    df["price"].fillna(0.0, inplace=True)
-    df["review_rating"].fillna(3.0, inplace=True) # Use a neutral rating for missing ones
-    df["accommodates"].fillna(1, inplace=True)
-
-    # Clean and validate text columns
-    for col in ["tags", "location", "property_type"]:
-        df[col] = df[col].fillna("").astype(str) # Missing text becomes an empty string
-
-    # Ensure listing_id is present and usable for the final step. Drop rows with invalid IDs.
-    if 'listing_id' not in df.columns:
-        return [] # Cannot proceed without IDs
-    df.dropna(subset=['listing_id'], inplace=True)
-
-    # Filtering Layer 
     user_budget_min = float(user.get("budget_min", 0))
     user_budget_max = float(user.get("budget_max", float('inf')))
     user_group_size = int(user.get("group_size", 1))
 
-    df_filtered = df[
-        (df["price"] >= user_budget_min)
-        & (df["price"] <= user_budget_max)
-        & (df["accommodates"] >= user_group_size)
-    ].copy() # Use .copy() to avoid SettingWithCopyWarning
+    features = ListingFeatures(listings) if version is None else FEATURE_CACHE.get(listings, version)
+
+    # If there is nothing left after cleaning, exit early.
+    if not features.size:
+        return []
+
+    # Filtering Layer
+    mask = features.in_budget(user_budget_min, user_budget_max) & (features.accommodates >= user_group_size)
+    if near is not None:
+        mask &= features.within(near)
+    candidates = np.flatnonzero(mask)
 
-    if df_filtered.empty:
+    if not len(candidates):
         print("No listings match your budget and group size after filtering.")
         return []
 
+    price = features.price[candidates]
+    rating = features.rating[candidates]
+
     # Scoring Layer
-    df_filtered["score"] = 0.0
+    score = np.zeros(len(candidates))
 
     # Environment Score
     preferred_env = user.get("preferred_environment", "").strip().lower()
     if preferred_env:
-        # Combine relevant text fields into one for searching
-        search_space = (df_filtered["tags"].str.lower() + " " +
-                        df_filtered["location"].str.lower() + " " +
-                        df_filtered["property_type"].str.lower())
-        
-        env_mask = search_space.str.contains(preferred_env, na=False)
-        df_filtered.loc[env_mask, "score"] += float(weights["env"])
+        score[features.environment_match(preferred_env)[candidates]] += float(weights["env"])
 
     # Price Proximity Score
     bmin = user_budget_min
@@ -77,21 +234,146 @@ def get_recommendations(user, listings, top_n=5, weights=None):
     mid = (bmin + bmax) / 2
     rng = bmax - bmin
 
-    if rng > 0:
-        half_range = rng / 2
-        proximity = 1 - (np.abs(df_filtered["price"] - mid) / half_range)
-    else:
-        denominator = max(mid, 1.0)
-        proximity = 1 - (np.abs(df_filtered["price"] - mid) / denominator)
+    with np.errstate(invalid="ignore"):  # an open-ended budget gives NaN, as it always has
+        if rng > 0:
+            half_range = rng / 2
+            proximity = 1 - (np.abs(price - mid) / half_range)
+        else:
+            denominator = max(mid, 1.0)
+            proximity = 1 - (np.abs(price - mid) / denominator)
 
-    df_filtered["score"] += proximity.clip(lower=0, upper=1) * float(weights["price"])
+    score += np.clip(proximity, 0, 1) * float(weights["price"])
 
     # Rating Score
-    rating_normalized = (df_filtered["review_rating"] / 5.0).clip(lower=0, upper=1)
-    df_filtered["score"] += rating_normalized * float(weights["rating"])
+    rating_normalized = np.clip(rating / 5.0, 0, 1)
+    score += rating_normalized * float(weights["rating"])
 
-    # Final Sorting and Selection
-    df_sorted = df_filtered.sort_values(by=["score", "review_rating"], ascending=[False, False]).head(int(top_n))
+    # Final Selection: the top_n by score, then rating; only those are sorted
+    order = top_k(score, rating, top_n)
 
     # Return the final list of recommended listing dictionaries
-    return df_sorted.to_dict(orient='records')
\ No newline at end of file
+    return features.records(candidates[order], score[order])
+
+
+def _user_fields(user):
+    user = user.to_dict() if hasattr(user, "to_dict") else user
+    return (
+        float(user.get("budget_min", 0)),
+        float(user.get("budget_max", float('inf'))),
+        int(user.get("group_size", 1)),
+        (user.get("preferred_environment") or "").strip().lower(),
+    )
+
+
+def recommend_batch(users, listings, top_n=5, weights=None, version=None, block_cells=4_000_000):
+    """
+    get_recommendations for many users at once: one list of recommendations
+    per user, in input order, identical to calling it for each user.
+
+    Budget, group size, environment, price proximity and rating terms are
+    computed as (users x listings) matrices, block_cells entries at a time, so
+    memory stays bounded however many users are scored.
+    """
+    if weights is None:
+        weights = dict(price=40.0, env=30.0, rating=30.0)
+    users = list(users)
+    if not users or not listings:
+        return [[] for _ in users]
+
+    features = ListingFeatures(listings) if version is None else FEATURE_CACHE.get(listings, version)
+    if not features.size:
+        return [[] for _ in users]
+
+    fields = [_user_fields(u) for u in users]
+    budget_min = np.array([f[0] for f in fields])
+    budget_max = np.array([f[1] for f in fields])
+    group_size = np.array([f[2] for f in fields])
+    # Users share a handful of environments, each with one precomputed bitmap
+    environments = sorted({f[3] for f in fields if f[3]})
+    env_hits = np.zeros((len(environments) + 1, features.size), dtype=bool)  # last row: no environment
+    for i, environment in enumerate(environments):
+        env_hits[i] = features.environment_match(environment)
+    env_of_user = np.array([environments.index(f[3]) if f[3] else len(environments) for f in fields])
+
+    mid = (budget_min + budget_max) / 2
+    rng = budget_max - budget_min
+    denominator = np.where(rng > 0, rng / 2, np.maximum(mid, 1.0))
+    unbounded = ~np.isfinite(mid) | ~np.isfinite(denominator)
+    rating_term = np.clip(features.rating / 5.0, 0, 1) * float(weights["rating"])
+    k = max(int(top_n), 0)
+
+    winners = []  # (user, positions, scores)
+    block = max(1, block_cells // features.size)
+    for start in range(0, len(users), block):
+        users_in_block = slice(start, start + block)
+        price = features.price[None, :]
+        ok = (
+            (price >= budget_min[users_in_block, None])
+            & (price <= budget_max[users_in_block, None])
+            & (features.accommodates[None, :] >= group_size[users_in_block, None])
+        )
+        score = env_hits[env_of_user[users_in_block]] * float(weights["env"])
+        with np.errstate(invalid="ignore"):  # open-ended budgets give NaN, as in get_recommendations
+            proximity = 1 - (np.abs(price - mid[users_in_block, None]) / denominator[users_in_block, None])
+        np.clip(proximity, 0, 1, out=proximity)
+        proximity *= float(weights["price"])
+        score += proximity
+        score += rating_term[None, :]
+
+        # An open-ended budget makes every score of that user NaN, which ranks by rating alone
+        key = proximity  # reused as scratch space
+        np.copyto(key, score)
+        if unbounded[users_in_block].any():
+            np.nan_to_num(key, copy=False, nan=0.0)
+        np.copyto(key, -np.inf, where=~ok)
+        if 0 < k < features.size:
+            # k-th best key per user; only listings reaching it need ordering. Selecting the
+            # k-th smallest of the negated keys is much faster than the (M-k)-th of the keys.
+            np.negative(key, out=key)
+            cutoff = -np.partition(key, k - 1, axis=1)[:, k - 1, None]
+            np.negative(key, out=key)
+            shortlisted = ok & (key >= cutoff)
+        else:
+            shortlisted = ok if k else np.zeros_like(ok)
+        for offset, row in enumerate(shortlisted):
+            positions = np.flatnonzero(row)
+            # Score, then rating, both descending; ties keep listing order
+            positions = positions[np.lexsort((-features.rating[positions], -key[offset, positions]))[:k]]
+            winners.append((positions, score[offset, positions]))
+
+    # Build each recommended listing's record once, however many users share it
+    chosen = np.unique(np.concatenate([p for p, _ in winners])) if winners else np.empty(0, dtype=np.intp)
+    base = dict(zip(chosen.tolist(), features.records(chosen))) if len(chosen) else {}
+    return [
+        [dict(base[p], score=s) for p, s in zip(positions.tolist(), scores.tolist())]
+        for positions, scores in winners
+    ]
+
+
+def _json_safe(record):
+    return {k: (None if isinstance(v, float) and v != v else v) for k, v in record.items()}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from listings import Listings_File, load_listings
+    from user_crud import USERS_FILE, load_users
+
+    parser = argparse.ArgumentParser(description="Recommendations for every user profile in one batch.")
+    parser.add_argument("--users", default=USERS_FILE, help="users JSON file")
+    parser.add_argument("--listings", default=Listings_File, help="listings CSV or store directory")
+    parser.add_argument("--top-n", type=int, default=5, help="recommendations per user")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    profiles = load_users(args.users)
+    results = recommend_batch(profiles, load_listings(args.listings), top_n=args.top_n)
+    payload = {u.user_id: [_json_safe(r) for r in recs] for u, recs in zip(profiles, results)}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(payload, f, indent=2, default=str)
+        print(f"Wrote recommendations for {len(payload)} users to {args.out}.")
+    else:
+        print(json.dumps(payload, indent=2, default=str))
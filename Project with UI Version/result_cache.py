@@ -0,0 +1,163 @@
+# result_cache.py
+"""
+Bounded LRU caches for /api/listings results and per-user recommendations.
+
+The UI asks for the same filter/sort combinations over and over, and every
+page of a query used to redo the full filter and sort. Entries hold the
+filtered, ordered result (a view over store rows), so pages 2..N of a query
+are just a slice. Keys include the active dataset version, and the web
+server clears the cache whenever the dataset switches or listings change.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from listing_index import tokenize
+
+
+def _bound(value):
+    return None if value is None else float(value)
+
+
+def normalize_query(environment=None, min_price=None, max_price=None, accommodates=None,
+                    amenities=None, sort_by=None, ascending=True, fuzzy=False, query=None,
+                    near=None, bbox=None):
+    """
+    Hashable key for a listing query. Spellings that filter the same way map to
+    the same key: keyword tokens are matched as a set, amenities are must-haves
+    in any order, and "100" / 100.0 are the same price bound.
+    """
+    return (
+        tuple(sorted(set(tokenize(environment)))),
+        _bound(min_price),
+        _bound(max_price),
+        None if accommodates is None else int(accommodates),
+        tuple(sorted({a.strip().lower() for a in amenities or () if a.strip()})),
+        sort_by or None,
+        bool(ascending),
+        bool(fuzzy),
+        tuple(sorted(set(tokenize(query)))),
+        None if near is None else tuple(float(x) for x in near),
+        None if bbox is None else tuple(float(x) for x in bbox),
+    )
+
+
+class ResultCache:
+    """Least-recently-used cache with hit/miss counters (safe to share between request threads)."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Cached value or None; a hit makes the entry most recently used."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (dataset switched or listings changed); counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def user_fingerprint(user):
+    """The profile fields recommendations depend on; a changed profile never hits an old entry."""
+    get = user.get if isinstance(user, dict) else lambda k, d=None: getattr(user, k, d)
+    return (
+        _bound(get("budget_min")),
+        _bound(get("budget_max")),
+        None if get("group_size") is None else int(get("group_size")),
+        (get("preferred_environment") or "").strip().lower(),
+    )
+
+
+class RecommendationCache(ResultCache):
+    """
+    Serialized /api/recommend responses keyed by (user_id, top_n, dataset
+    version, profile fingerprint, ...). Entries expire after ttl seconds, and
+    all of a user's entries can be dropped at once when the profile changes.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0, clock=time.monotonic):
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.clock = clock
+        self.expirations = 0
+        self._by_user = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] > self.ttl:
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def invalidate_user(self, user_id):
+        """Drop every entry of one user (their budget, group size or environment changed)."""
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(ttl=self.ttl, expirations=self.expirations, users=len(self._by_user))
+        return stats
@@ -2,6 +2,7 @@ import json
 import pandas as pd
 import requests
 import re
+from dedup import drop_near_duplicates
 from configs import (
     MODEL,
     SYNTHETIC_LISTING_CSV_PATH,
@@ -92,12 +93,20 @@ def merge_with_real_listings(
     real_file=CLEANED_LISTING_CSV_PATH,
     synthetic_file=SYNTHETIC_LISTING_CSV_PATH,
     output_file=MERGED_LISTING_CSV_PATH,
+    dedupe=True,
 ):
     df_real = pd.read_csv(real_file)
     df_synth = pd.read_csv(synthetic_file)
     if df_synth.empty:
         raise ValueError("Synthetic listings CSV is empty. Cannot merge.")
     df_merged = pd.concat([df_real, df_synth], ignore_index=True)
+    if dedupe:
+        # LLM output repeats itself; drop synthetic near-copies (real rows are always kept)
+        rows = df_merged.to_dict(orient="records")
+        _, duplicates = drop_near_duplicates(rows, protected=len(df_real))
+        if duplicates:
+            df_merged = df_merged.drop(index=[i for i, _, _ in duplicates]).reset_index(drop=True)
+            print(f"Dropped {len(duplicates)} near-duplicate synthetic listings.")
     df_merged.to_csv(output_file, index=False)
     print("Merged listings saved to merged_listings.csv")
 
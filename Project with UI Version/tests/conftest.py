@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules live flat in the project folder, next to this tests/ folder
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
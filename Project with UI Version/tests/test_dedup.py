@@ -0,0 +1,45 @@
+import random
+
+import numpy as np
+
+from dedup import MinHasher, find_near_duplicates, shingles
+
+AMENITIES = [f"amenity {i}" for i in range(40)]
+TAGS = ["lake", "city", "quiet", "family", "beach", "nightlife"]
+
+
+def make_listings(n=400, seed=1):
+    rng = random.Random(seed)
+    bases = [{"name": f"Stay {i} by the {rng.choice(TAGS)}", "amenities": ", ".join(rng.sample(AMENITIES, 10)),
+              "tags": ", ".join(rng.sample(TAGS, 2))} for i in range(40)]
+    listings = []
+    for _ in range(n):
+        # Variants of a few base listings with some amenities swapped
+        listing = dict(rng.choice(bases))
+        amenities = listing["amenities"].split(", ")
+        for k in rng.sample(range(len(amenities)), rng.randint(0, 5)):
+            amenities[k] = rng.choice(AMENITIES)
+        listing["amenities"] = ", ".join(amenities)
+        listings.append(listing)
+    return listings
+
+
+def test_no_kept_listing_has_a_missed_near_copy_in_its_buckets():
+    listings = make_listings()
+    num_perm, threshold, protected = 32, 0.7, 25
+    # One hash per band: two listings share a bucket exactly when one of their minhashes agrees
+    duplicates = find_near_duplicates(listings, threshold=threshold, num_perm=num_perm, bands=num_perm,
+                                      protected=protected)
+    signatures = MinHasher(num_perm).signatures([shingles(l) for l in listings])
+
+    dropped = {i for i, _, _ in duplicates}
+    assert dropped and min(dropped) >= protected
+    for i, j, similarity in duplicates:
+        assert j < i and j not in dropped and similarity >= threshold
+    kept = [i for i in range(len(listings)) if i not in dropped]
+    for pos, i in enumerate(kept):
+        if i < protected:
+            continue
+        equal = signatures[kept[:pos]] == signatures[i]
+        shared = equal.any(axis=1)
+        assert not np.any(equal[shared].mean(axis=1) >= threshold), i
@@ -0,0 +1,198 @@
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from listing_catalog import ListingCatalog, delta_path
+from listing_store import PRESORTED_COLUMNS, ListingStore
+from listings import Listing, filter_planned, load_listings, search_listings
+
+LOCATIONS = ["Annex", "Brookhaven", "Leslieville", "Liberty Village", "Yorkville"]
+TYPES = ["Apartment", "Condo", "House", "Loft"]
+AMENITIES = ["Wifi", "Kitchen", "Washer", "Free parking", "Pool", "Gym"]
+TAGS = ["lake", "city", "quiet", "nightlife", "family"]
+
+
+def make_listings(n=60, seed=5):
+    rng = random.Random(seed)
+    return [{
+        "listing_id": i,
+        "name": f"{rng.choice(['Sunny', 'Cozy', 'Modern'])} {rng.choice(TYPES)} {i}",
+        "location": rng.choice(LOCATIONS),
+        "property_type": rng.choice(TYPES),
+        "accommodates": rng.randint(1, 8),
+        "amenities": ", ".join(rng.sample(AMENITIES, 3)),
+        "price": float(rng.choice([60, 80, 120, 150, 200, 320])),
+        "min_nights": rng.randint(1, 3),
+        "max_nights": rng.choice([7, 14, 30]),
+        "review_rating": round(rng.uniform(3.5, 5.0), 1),
+        "tags": ", ".join(rng.sample(TAGS, 2)),
+        "latitude": 43.6 + rng.random() / 10,
+        "longitude": -79.45 + rng.random() / 10,
+    } for i in range(n)]
+
+
+def live_ids(store, rows):
+    rows = np.asarray(rows, dtype=np.intp)
+    if store.deleted is not None:
+        rows = rows[~store.deleted[rows]]
+    return [str(i) for i in store.ids[rows].tolist()]
+
+
+def view_ids(view):
+    return [str(i) for i in view.store.ids[view.rows].tolist()]
+
+
+def comparable_stats(store):
+    # Histogram edges are fixed when the stats are first built, so compare everything else
+    stats = store.stats.to_dict(top=50)
+    for column in stats["columns"].values():
+        column.pop("histogram", None)
+        if column.get("mean") is not None:
+            column["mean"] = pytest.approx(column["mean"])
+    return stats
+
+
+def assert_same_indexes(patched, fresh):
+    """Indexes patched in place answer like the ones built from scratch over the live rows."""
+    assert set(patched.id_index) == set(fresh.id_index)
+    for key, row in fresh.id_index.items():
+        assert patched.records([patched.id_index[key]])[0].to_dict() == fresh.records([row])[0].to_dict()
+
+    for field, postings in fresh.token_index.postings.items():
+        patched_postings = patched.token_index.postings[field]
+        for token, rows in postings.items():
+            assert live_ids(patched, patched_postings[token]) == live_ids(fresh, rows), (field, token)
+        for token, rows in patched_postings.items():
+            assert token in postings or not live_ids(patched, rows), (field, token)
+
+    for word in ("brookhavn", "yorkvile", "lak", "nightlfe"):
+        rows, _ = patched.trigram_index.rows(word, ("location", "tags"))
+        expected, _ = fresh.trigram_index.rows(word, ("location", "tags"))
+        assert live_ids(patched, rows) == live_ids(fresh, expected), word
+
+    for prefix in ("a", "b", "l", "y", "c"):
+        assert patched.prefix_index.complete(prefix, limit=50) == fresh.prefix_index.complete(prefix, limit=50)
+
+    for column in PRESORTED_COLUMNS:
+        for ascending in (True, False):
+            assert (live_ids(patched, patched.sort_permutation(column, ascending))
+                    == live_ids(fresh, fresh.sort_permutation(column, ascending))), (column, ascending)
+    for low, high in ((None, 100), (80, 200), (150, None)):
+        assert (sorted(live_ids(patched, patched.price_index.range_rows(low, high)))
+                == sorted(live_ids(fresh, fresh.price_index.range_rows(low, high))))
+
+    for lat, lon, km in ((43.65, -79.4, 3), (43.62, -79.44, 1.5)):
+        rows, _ = patched.spatial_index.radius_rows(lat, lon, km)
+        expected, _ = fresh.spatial_index.radius_rows(lat, lon, km)
+        assert live_ids(patched, rows) == live_ids(fresh, expected)
+    rows = patched.spatial_index.bbox_rows(43.62, -79.43, 43.68, -79.38)
+    assert live_ids(patched, rows) == live_ids(fresh, fresh.spatial_index.bbox_rows(43.62, -79.43, 43.68, -79.38))
+
+    assert comparable_stats(patched) == comparable_stats(fresh)
+
+
+def assert_same_results(view, fresh_view):
+    assert view_ids(view) == view_ids(fresh_view)
+    for args in (dict(environment="lake"), dict(min_price=70, max_price=160), dict(amenities=["pool"]),
+                 dict(amenities=["wifi"], min_accommodates=3), dict(environment="brookhavn", fuzzy=True),
+                 dict(near=(43.65, -79.4, 3)), dict(environment="rooftop")):
+        assert view_ids(filter_planned(view, **args)[0]) == view_ids(filter_planned(fresh_view, **args)[0]), args
+    for column in ("price", "review_rating", "accommodates"):
+        assert view_ids(view.order_by(column, False)) == view_ids(fresh_view.order_by(column, False))
+    ranked, scores = search_listings(view, "rooftop pool lake")
+    expected, expected_scores = search_listings(fresh_view, "rooftop pool lake")
+    assert view_ids(ranked) == view_ids(expected)
+    assert np.allclose(scores, expected_scores)
+
+
+def test_incremental_indexes_match_a_rebuild(tmp_path):
+    csv = str(tmp_path / "listings.csv")
+    pd.DataFrame(make_listings()).to_csv(csv, index=False)
+    listings = load_listings(csv, use_cache=False)
+    store = listings.store
+    store.trigram_index
+    store.stats
+    store.price_index
+    catalog = ListingCatalog(listings, csv_path=csv)
+
+    rng = random.Random(11)
+    for step in range(40):
+        ids = [str(i) for i in store.ids[store.live_rows()].tolist()]
+        op = step % 3
+        if op == 0:
+            catalog.add({**make_listings(1, seed=step)[0], "listing_id": None,
+                         "location": rng.choice(LOCATIONS + ["Rooftop Gardens"]),
+                         "amenities": "Wifi, Rooftop sauna"})
+        elif op == 1:
+            catalog.update(rng.choice(ids), {"price": rng.choice([55.0, 140.0]), "tags": "lake, rooftop",
+                                             "latitude": 43.61 + rng.random() / 20})
+        else:
+            assert catalog.delete(rng.choice(ids))
+
+    view = catalog.listings
+    fresh = ListingStore.from_records(view.to_list(), record=Listing).build_indexes()
+    assert_same_indexes(store, fresh)
+    assert_same_results(view, fresh.view())
+    assert view.find(view_ids(view)[-1]) is not None
+
+    # Loading the base CSV again replays the delta log into the same listings
+    assert os.path.getsize(delta_path(csv)) > 0
+    replayed = load_listings(csv, use_cache=False)
+    assert_same_indexes(replayed.store, fresh)
+    assert_same_results(replayed, fresh.view())
+
+
+def test_compact_keeps_symlinked_csv(tmp_path):
+    target = tmp_path / "data" / "listings.csv"
+    target.parent.mkdir()
+    pd.DataFrame(make_listings(5)).to_csv(target, index=False)
+    link = tmp_path / "listings.csv"
+    link.symlink_to(target)
+
+    catalog = ListingCatalog(load_listings(str(link), use_cache=False), csv_path=str(link))
+    catalog.delete(0)
+    catalog.compact()
+
+    assert link.is_symlink()
+    assert len(pd.read_csv(target)) == 4
+    assert not os.path.exists(str(target) + ".tmp")
+
+
+@pytest.mark.parametrize("id_column", ["id", None])
+def test_compact_keeps_the_csv_schema_and_row_order(tmp_path, id_column):
+    rows = make_listings(6)
+    base = pd.DataFrame({
+        # Source column order, an id under its alternative name and a column the store does not know
+        **({id_column: [r["listing_id"] for r in rows]} if id_column else {}),
+        "host": [f"host {i}" for i in range(6)],
+        **{k: [r[k] for r in rows] for k in ("name", "price", "min_nights", "max_nights", "location",
+                                             "property_type", "accommodates", "amenities", "review_rating", "tags")},
+    })
+    csv = str(tmp_path / "listings.csv")
+    base.to_csv(csv, index=False)
+    before = pd.read_csv(csv)
+
+    catalog = ListingCatalog(load_listings(csv, use_cache=False), csv_path=csv)
+    catalog.update(2, {"price": 999.0, "min_nights": 4})
+    catalog.delete(4)
+    added = catalog.add({**rows[0], "listing_id": None, "name": "Brand new"})
+    catalog.compact()
+
+    after = pd.read_csv(csv)
+    assert list(after.columns) == list(before.columns)
+    assert after.dtypes.to_dict() == before.dtypes.to_dict()
+    assert len(after) == 6
+    assert after["name"].tolist() == before["name"].drop(index=4).tolist() + ["Brand new"]
+    assert after.loc[2, "price"] == 999.0 and after.loc[2, "min_nights"] == 4
+    assert after.loc[2, "host"] == "host 2" and pd.isna(after.loc[5, "host"])
+    unchanged = [0, 1, 3]
+    pd.testing.assert_frame_equal(after.loc[unchanged], before.loc[unchanged])
+    if id_column:
+        assert after[id_column].tolist() == [0, 1, 2, 3, 5, added.listing_id]
+
+    assert os.path.getsize(delta_path(csv)) == 0
+    reloaded = load_listings(csv, use_cache=False)
+    assert [l.name for l in reloaded] == after["name"].tolist()
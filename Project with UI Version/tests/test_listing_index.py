@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from listing_index import GridIndex, haversine_km
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(4)
+    # Spread over the globe, plus clusters at both poles and on either side of ±180°
+    lat = np.concatenate([rng.uniform(-90, 90, 2000), rng.uniform(84, 90, 300), rng.uniform(-90, -84, 300),
+                          rng.uniform(-60, 60, 400)])
+    lon = np.concatenate([rng.uniform(-180, 180, 2600), rng.choice([-1, 1], 400) * rng.uniform(178, 180, 400)])
+    return lat, lon
+
+
+@pytest.mark.parametrize("lat, lon, km", [
+    (0.0, 179.9, 50), (10.0, -179.95, 120), (-35.0, 180.0, 300),
+    (88.5, 20.0, 200), (89.9, -100.0, 30), (-87.0, 170.0, 600), (80.0, 179.0, 400),
+    (45.0, 0.0, 2500), (0.0, 0.0, 21000),
+])
+def test_radius_rows_matches_brute_force(points, lat, lon, km):
+    index = GridIndex(*points, cell_km=25.0)
+    rows, distances = index.radius_rows(lat, lon, km)
+    all_distances = haversine_km(lat, lon, *points)
+    expected = np.flatnonzero(all_distances <= km)
+    assert len(expected)
+    assert np.array_equal(rows, expected)
+    assert np.allclose(distances, all_distances[expected])
+
+
+def test_bbox_rows_across_the_antimeridian(points):
+    index = GridIndex(*points, cell_km=25.0)
+    lat, lon = points
+    rows = index.bbox_rows(-30.0, 178.5, 30.0, -178.5)
+    expected = np.flatnonzero((lat >= -30) & (lat <= 30) & ((lon >= 178.5) | (lon <= -178.5)))
+    assert len(expected)
+    assert np.array_equal(rows, expected)
+    plain = index.bbox_rows(10.0, -20.0, 40.0, 30.0)
+    assert np.array_equal(plain, np.flatnonzero((lat >= 10) & (lat <= 40) & (lon >= -20) & (lon <= 30)))
@@ -0,0 +1,86 @@
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from listing_storage import build_store_from_batches, cache_path, load_cache, open_store, save_cache, save_store
+from listing_store import ListingStore
+from listings import load_listings
+
+COLUMNS = {
+    "name": ["Loft", "Cabin", "Studio", "Villa"],
+    "location": ["Paris", "Oslo", "Paris", "Rome"],
+    "property_type": ["Apartment", "Cabin", "Apartment", "Villa"],
+    "accommodates": [2, 4, 1, 8],
+    "amenities": ["Wifi, Kitchen", "Fireplace", "Wifi", "Pool, Wifi"],
+    "price": [120.0, 90.0, 60.0, 400.0],
+    "min_nights": [1, 2, 1, 3],
+    "max_nights": [30, 14, 7, 21],
+    "review_rating": [4.5, 4.8, 3.9, 4.9],
+    "tags": ["city", "nature", "city", "luxury"],
+}
+
+
+def same_ids(left, right):
+    assert len(left) == len(right)
+    for a, b in zip(left, right):
+        assert type(a) is type(b), (a, b)
+        assert a == b or (isinstance(a, float) and math.isnan(a) and math.isnan(b)), (a, b)
+
+
+def write_csv(path, ids):
+    pd.DataFrame({"listing_id": ids, **COLUMNS}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_float_ids_round_trip_through_cache(tmp_path):
+    csv = write_csv(tmp_path / "listings.csv", [1.0, 2.0, np.nan, 4.0])
+    cold = load_listings(csv)
+    assert os.path.exists(cache_path(csv))
+    warm = load_listings(csv)
+    same_ids(cold.store.ids.tolist(), warm.store.ids.tolist())
+    assert math.isnan(warm.store.ids[2])
+
+
+def test_mixed_ids_round_trip_through_cache(tmp_path):
+    csv = write_csv(tmp_path / "listings.csv", [1, 2, 3, 4])
+    ids = [7, 2.5, "abc", None]
+    store = ListingStore.from_records([{"listing_id": i, **{k: v[n] for k, v in COLUMNS.items()}}
+                                       for n, i in enumerate(ids)])
+    save_cache(store, csv)
+    same_ids(store.ids.tolist(), load_cache(csv).ids.tolist())
+
+
+def test_ids_round_trip_through_store_directory(tmp_path):
+    batches = [
+        ListingStore.from_records([{"listing_id": i, **{k: v[n] for k, v in COLUMNS.items()}}
+                                   for n, i in enumerate(ids)]).view()
+        for ids in ([1, 2, 3, 4], [5.0, float("nan"), "x", None])
+    ]
+    opened = open_store(build_store_from_batches(batches, str(tmp_path / "mixed")))
+    expected = batches[0].store.ids.tolist() + batches[1].store.ids.tolist()
+    same_ids(expected, opened.ids.tolist())
+    same_ids(expected[4:], opened.ids[np.arange(4, 8)].tolist())
+    assert opened.ids[6] == "x" and opened.ids[7] is None
+
+    ints = ListingStore.from_frame(pd.DataFrame({"listing_id": [10, 11, 12, 13], **COLUMNS}))
+    opened = open_store(save_store(ints, str(tmp_path / "ints")))
+    assert opened.ids.dtype == np.int64
+    assert opened.ids.tolist() == [10, 11, 12, 13]
+
+
+def test_corrupt_cache_falls_back_to_the_csv(tmp_path):
+    csv = write_csv(tmp_path / "listings.csv", [1, 2, 3, 4])
+    expected = load_listings(csv).store.ids.tolist()
+    with open(cache_path(csv), "rb") as f:
+        data = f.read()
+
+    for broken in (data[:len(data) // 2], b"not a zip file", b""):
+        with open(cache_path(csv), "wb") as f:
+            f.write(broken)
+        assert load_cache(csv) is None
+        assert load_listings(csv).store.ids.tolist() == expected
+        # The CSV load wrote a fresh cache in its place
+        assert load_cache(csv).ids.tolist() == expected
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
@@ -0,0 +1,71 @@
+import random
+
+import numpy as np
+
+from listing_store import ListingStore
+
+WORDS = ["lake", "cabin", "city", "loft", "quiet", "sunny", "pool", "garden", "view", "modern"]
+
+
+def make_listing(rng, i):
+    return {
+        "listing_id": i,
+        "name": " ".join(rng.sample(WORDS, 3)),
+        "location": rng.choice(["Annex", "Leslieville", "Yorkville"]),
+        "property_type": rng.choice(["Condo", "House"]),
+        "accommodates": rng.randint(1, 6),
+        "amenities": ", ".join(rng.sample(["Wifi", "Pool", "Kitchen", "Sauna", "Gym"], 2)),
+        "price": float(rng.randint(50, 300)),
+        "review_rating": 4.0,
+        "tags": ", ".join(rng.sample(WORDS, 2)) + f", tag{i % 50}",
+    }
+
+
+def test_bm25_is_patched_in_place_and_matches_a_rebuild():
+    rng = random.Random(2)
+    store = ListingStore.from_records([make_listing(rng, i) for i in range(600)])
+    index = store.bm25_index
+    live = {int(i): store.records([row])[0] for row, i in enumerate(store.ids.tolist())}
+
+    # Enough single-row adds to fold the tail into the groups at least once, with deletes in between
+    for i in range(600, 1000):
+        listing = make_listing(rng, i)
+        store.append_records([listing])
+        live[i] = listing
+        if i % 3 == 0:
+            gone = rng.choice(sorted(live))
+            store.delete_rows([store.row_of(gone)])
+            del live[gone]
+        if i % 97 == 0:
+            assert_same_search(store, live)
+    assert store.bm25_index is index
+    assert index.grouped > 600
+    assert_same_search(store, live)
+
+
+def assert_same_search(store, live):
+    fresh = ListingStore.from_records(list(live.values()))
+    assert store.bm25_index.size == len(live)
+    assert np.isclose(store.bm25_index.avg_length, fresh.bm25_index.avg_length)
+    for query in ("lake cabin", "pool", "tag7 sauna view", "nothing"):
+        rows, scores = store.bm25_index.search(query)
+        expected_rows, expected_scores = fresh.bm25_index.search(query)
+        # Rows ascend in both stores and the live listings keep their relative order
+        assert store.ids[rows].tolist() == fresh.ids[expected_rows].tolist(), query
+        assert np.allclose(scores, expected_scores), query
+
+
+def test_appends_grow_columns_in_spare_capacity():
+    rng = random.Random(4)
+    store = ListingStore.from_records([make_listing(rng, i) for i in range(100)])
+    store.delete_rows([3])
+    reallocations, buffer = 0, None
+    for i in range(100, 1100):
+        store.append_records([make_listing(rng, i)])
+        address = store.numeric["price"].__array_interface__["data"][0]
+        if address != buffer:
+            reallocations, buffer = reallocations + 1, address
+    assert reallocations <= 6  # doubling: a handful of copies for 1000 single-row appends
+    assert len(store.numeric["price"]) == len(store.ids) == len(store.deleted) == store.size == 1100
+    assert len(store.codes["name"]) == store.size
+    assert store.row_of(1099) == 1099 and store.records([1099])[0]["listing_id"] == 1099
@@ -0,0 +1,142 @@
+import math
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from listing_index import split_amenities, tokenize, trigrams
+from catalog_stats import PRICE_BUCKETS
+from listings import (facets, filter_by_amenities, filter_by_budget, filter_by_keyword, listings_from_records,
+                      search_listings, suggest)
+
+LOCATIONS = ["Annex", "Annex North", "Brookhaven", "Bloor West", "Leslieville", "Liberty Village"]
+TYPES = ["Apartment", "Condo", "House", "Loft"]
+AMENITIES = ["Wifi", "Fast wifi – 300 Mbps", "Kitchen", "Kitchenette", "Washer", "Free parking on premises",
+             "Free street parking", "Pool", "Gym"]
+TAGS = ["lake", "city", "quiet", "nightlife", "family"]
+
+
+def make_listings(n=120, seed=7):
+    rng = random.Random(seed)
+    return [{
+        "listing_id": i,
+        "name": f"{rng.choice(['Sunny', 'Cozy', 'Modern'])} {rng.choice(TYPES)} {i}",
+        "location": rng.choice(LOCATIONS),
+        "property_type": rng.choice(TYPES),
+        "accommodates": rng.randint(1, 8),
+        "amenities": ", ".join(rng.sample(AMENITIES, rng.randint(0, 4))),
+        "price": float(rng.choice([45, 60, 99, 100, 150, 240, 600, 1200])),
+        "min_nights": 1,
+        "max_nights": 30,
+        "review_rating": round(rng.uniform(3.5, 5.0), 1),
+        "tags": ", ".join(rng.sample(TAGS, rng.randint(1, 3))),
+    } for i in range(n)]
+
+
+def ids(view):
+    return [listing.listing_id for listing in view]
+
+
+@pytest.mark.parametrize("wanted", [["wifi"], ["Kitchen"], ["free parking"], ["wifi", "pool"],
+                                    "washer, free parking", ["sauna"], []])
+def test_amenity_filter_matches_every_word_of_each_must_have(wanted):
+    rows = make_listings()
+    requests = wanted.split(",") if isinstance(wanted, str) else wanted
+
+    def has(row, request):
+        words = set(tokenize(request))
+        return any(words <= set(tokenize(a)) for a in split_amenities(row["amenities"]))
+
+    expected = [r["listing_id"] for r in rows if all(has(r, request) for request in requests)]
+    assert ids(filter_by_amenities(listings_from_records(rows), wanted)) == expected
+
+
+@pytest.mark.parametrize("prefix, limit, fields", [
+    ("an", 10, None), ("B", 10, None), ("l", 2, None), ("L", 3, ("location",)), ("c", 1, None),
+    ("co", 10, ("property_type",)), ("", 10, None), ("zz", 10, None), ("a", 0, None),
+])
+def test_suggest_ranks_by_count_then_alphabetically(prefix, limit, fields):
+    rows = make_listings()
+    rows[0]["location"] = "annex"  # same key as "Annex"; the more common spelling is shown
+    fields = fields or ("location", "property_type", "name")
+    counts = {}
+    for row in rows:
+        for field in fields:
+            key = row[field].lower()
+            if prefix and key.startswith(prefix.lower()):
+                counts[field, key] = counts.get((field, key), 0) + 1
+    expected = sorted(counts.items(), key=lambda item: (-item[1], item[0][1], item[0][0]))[:limit]
+
+    found = suggest(listings_from_records(rows), prefix, limit=limit, fields=fields)
+    assert [(s["field"], s["value"].lower(), s["count"]) for s in found] == [(f, k, c) for (f, k), c in expected]
+    assert all(s["value"] != "annex" for s in found)
+
+
+@pytest.mark.parametrize("keyword", ["brookhavn", "Libery vilage", "anex", "nightlfe quite", "lake", "qqqq"])
+def test_fuzzy_keyword_matches_every_word_by_trigram_similarity(keyword):
+    rows = make_listings()
+    fields = ("location", "tags")
+
+    def similarity(a, b):
+        a, b = trigrams(a), trigrams(b)
+        return len(a & b) / len(a | b)
+
+    expected = {}
+    words = set(tokenize(keyword))
+    for row in rows:
+        tokens = set(tokenize(" ".join(row[f] for f in fields)))
+        best = [max((similarity(word, t) for t in tokens), default=0.0) for word in words]
+        if all(b >= 0.3 for b in best):
+            expected[row["listing_id"]] = sum(best) / len(best)
+
+    view = listings_from_records(rows)
+    assert ids(filter_by_keyword(view, keyword, fields=fields, fuzzy=True)) == sorted(expected)
+    found, scores = view.store.trigram_index.rows(keyword, fields)
+    assert np.allclose(scores, [expected[i] for i in view.store.ids[found].tolist()])
+
+
+@pytest.mark.parametrize("query", ["wifi", "cozy kitchen", "free parking lake", "Loft 7", "sauna"])
+def test_search_ranks_by_bm25(query):
+    rows = make_listings()
+    docs = {r["listing_id"]: Counter(tokenize(" ".join([r["name"], r["tags"], r["amenities"]]))) for r in rows}
+    average = sum(sum(doc.values()) for doc in docs.values()) / len(docs)
+    expected = {}
+    for term in set(tokenize(query)):
+        matching = [i for i, doc in docs.items() if doc[term]]
+        idf = math.log(1 + (len(docs) - len(matching) + 0.5) / (len(matching) + 0.5))
+        for i in matching:
+            tf, length = docs[i][term], sum(docs[i].values())
+            norm = 1.2 * (1 - 0.75 + 0.75 * length / average)
+            expected[i] = expected.get(i, 0.0) + idf * tf * 2.2 / (tf + norm)
+
+    ranked, scores = search_listings(listings_from_records(rows), query)
+    assert sorted(ids(ranked)) == sorted(expected)
+    assert np.allclose(scores, [expected[i] for i in ids(ranked)])
+    assert all(np.diff(scores) <= 1e-12)
+
+
+@pytest.mark.parametrize("top", [10, 2])
+def test_facets_count_the_filtered_listings(top):
+    rows = make_listings()
+    view = filter_by_budget(listings_from_records(rows), 50, 700)
+    kept = [r for r in rows if 50 <= r["price"] <= 700]
+
+    def ranked(values):
+        counts = Counter(values)
+        return [{"value": v, "count": c} for v, c in sorted(counts.items(), key=lambda item: (-item[1], item[0]))][:top]
+
+    found = facets(view, top=top)
+    assert found["total"] == len(kept)
+    assert found["property_type"] == ranked(r["property_type"] for r in kept)
+    assert found["location"] == ranked(r["location"] for r in kept)
+    assert found["tags"] == ranked(t for r in kept for t in split_amenities(r["tags"]))
+    accommodates = Counter(r["accommodates"] for r in kept)
+    assert found["accommodates"] == [{"value": v, "count": accommodates[v]} for v in sorted(accommodates)]
+
+    bounds = list(zip(PRICE_BUCKETS, list(PRICE_BUCKETS[1:]) + [None]))
+    assert [(b["min"], b["max"]) for b in found["price"]] == bounds
+    assert [b["count"] for b in found["price"]] == [
+        sum(low <= r["price"] and (high is None or r["price"] < high) for r in kept) for low, high in bounds
+    ]
+    assert [b["value"] for b in found["price"]][-2:] == ["500-1000", "1000+"]
@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from listings import (filter_by_accommodates, filter_by_amenities, filter_by_bbox, filter_by_budget,
+                      filter_by_keyword, filter_by_radius, filter_planned, listings_from_records)
+
+LOCATIONS = ["Annex", "Brookhaven", "Leslieville", "Liberty Village", "Yorkville"]
+AMENITIES = ["Wifi", "Kitchen", "Washer", "Free parking", "Pool", "Gym"]
+
+
+def make_listings(n=300, seed=4):
+    rng = random.Random(seed)
+    return [{
+        "listing_id": i,
+        "name": f"Stay {i}",
+        "location": rng.choice(LOCATIONS),
+        "property_type": rng.choice(["Condo", "House", "Loft"]),
+        "accommodates": rng.randint(1, 8),
+        "amenities": ", ".join(rng.sample(AMENITIES, 3)),
+        "price": float(rng.randint(40, 400)),
+        "min_nights": 1,
+        "max_nights": 30,
+        "review_rating": 4.5,
+        # "nightlife" is rare, "city" common
+        "tags": "nightlife" if i % 50 == 0 else rng.choice(["city", "city, lake", "city, quiet"]),
+        "latitude": 43.6 + rng.random() / 10,
+        "longitude": -79.45 + rng.random() / 10,
+    } for i in range(n)]
+
+
+def ids(view):
+    return [listing.listing_id for listing in view]
+
+
+@pytest.mark.parametrize("args", [
+    dict(environment="city"),
+    dict(environment="city", min_price=100, max_price=250),
+    dict(environment="lake", min_price=300, min_accommodates=4),
+    dict(max_price=90, amenities=["wifi", "pool"]),
+    dict(environment="nightlife", min_price=40, max_price=400, min_accommodates=1, amenities=["kitchen"]),
+    dict(min_accommodates=6, near=(43.65, -79.4, 3)),
+    dict(environment="quiet", bbox=(43.62, -79.43, 43.68, -79.38)),
+    dict(environment="rooftop", min_price=100),
+    dict(),
+])
+def test_planned_filters_match_the_chained_filters(args):
+    view = listings_from_records(make_listings())
+    expected = view
+    if "environment" in args:
+        expected = filter_by_keyword(expected, args["environment"])
+    if "min_price" in args or "max_price" in args:
+        expected = filter_by_budget(expected, args.get("min_price"), args.get("max_price"))
+    if "min_accommodates" in args:
+        expected = filter_by_accommodates(expected, args["min_accommodates"])
+    if "amenities" in args:
+        expected = filter_by_amenities(expected, args["amenities"])
+    if "near" in args:
+        expected = filter_by_radius(expected, *args["near"])
+    if "bbox" in args:
+        expected = filter_by_bbox(expected, *args["bbox"])
+
+    planned, plan = filter_planned(view, **args)
+    assert sorted(ids(planned)) == sorted(ids(expected))
+    assert plan.explain()["rows_out"] == len(ids(expected))
+
+
+def test_most_selective_predicate_drives_the_plan():
+    view = listings_from_records(make_listings())
+    _, plan = filter_planned(view, environment="nightlife", min_price=40, max_price=400, min_accommodates=1)
+    steps = plan.explain()["steps"]
+
+    assert steps[0] == {"predicate": "keyword 'nightlife' in tags/location", "estimated_rows": 6,
+                        "access": "index scan"}
+    assert [step["access"] for step in steps[1:]] == ["filter candidates"] * 2
+    estimates = [step["estimated_rows"] for step in steps]
+    assert estimates == sorted(estimates)
+
+    # A narrow price range beats the common keyword
+    _, plan = filter_planned(view, environment="city", min_price=100, max_price=101)
+    assert plan.explain()["steps"][0]["predicate"] == "price in [100, 101]"
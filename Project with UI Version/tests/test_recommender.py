@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from listing_catalog import ListingCatalog
+from listings import listings_from_records
+from recommender import get_recommendations, recommend_batch
+
+ENVIRONMENTS = ["", "lake", "city", "quiet lake", "condo", "nowhere"]
+
+
+def make_listings(n=80, seed=3):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        rows.append({
+            "listing_id": i,
+            "name": f"Stay {i}",
+            "location": rng.choice(["Annex", "Lakeshore", "Downtown"]),
+            "property_type": rng.choice(["Condo", "House", "Loft"]),
+            "accommodates": rng.randint(1, 8),
+            "amenities": "Wifi, Kitchen",
+            # Few distinct prices and ratings, so ties decide part of the order
+            "price": float(rng.choice([60, 90, 120, 150, 250])),
+            "min_nights": 1,
+            "max_nights": 30,
+            "review_rating": rng.choice([4.0, 4.5, 5.0]),
+            "tags": ", ".join(rng.sample(["lake", "city", "quiet", "family"], 2)),
+        })
+    return rows
+
+
+def make_users(n=40, seed=9):
+    rng = random.Random(seed)
+    users = []
+    for _ in range(n):
+        low = rng.choice([0, 50, 100])
+        users.append({
+            "budget_min": low,
+            "budget_max": rng.choice([low, 120, 200, float("inf")]),
+            "group_size": rng.choice([1, 2, 4, 6]),
+            "preferred_environment": rng.choice(ENVIRONMENTS),
+        })
+    return users
+
+
+def ids(recommendations):
+    return [r["listing_id"] for r in recommendations]
+
+
+@pytest.mark.parametrize("top_n", [1, 5, 12, 100])
+def test_list_view_and_batch_recommend_the_same_listings(top_n):
+    rows = make_listings()
+    view = listings_from_records(rows)
+    users = make_users()
+
+    batch = recommend_batch(users, view, top_n=top_n, block_cells=500)
+    assert len(batch) == len(users)
+    for user, from_batch in zip(users, batch):
+        from_dicts = ids(get_recommendations(user, rows, top_n=top_n))
+        assert ids(get_recommendations(user, view, top_n=top_n)) == from_dicts
+        # Same again with the feature matrix taken from the per-version cache
+        assert ids(get_recommendations(user, view, top_n=top_n, version=("test", top_n))) == from_dicts
+        assert ids(from_batch) == from_dicts
+    assert any(batch)
+
+
+def test_budget_pruning_follows_catalog_edits():
+    rows = make_listings()
+    view = listings_from_records(rows)
+    view.store.price_index
+    catalog = ListingCatalog(view)
+    catalog.update(5, {"price": 75.0})
+    catalog.delete(7)
+    added = catalog.add({**rows[0], "listing_id": None, "price": 70.0})
+    # An edit appends the new version of the listing, so it moves to the end
+    rows = [r for r in rows if r["listing_id"] not in (5, 7)] + [{**rows[5], "price": 75.0}]
+    rows.append({**rows[0], "listing_id": added.listing_id, "price": 70.0})
+
+    for user in make_users() + [{"budget_min": 70, "budget_max": 80, "group_size": 1}]:
+        expected = ids(get_recommendations(user, rows, top_n=100))
+        assert ids(get_recommendations(user, catalog.listings, top_n=100)) == expected
+    assert ids(get_recommendations({"budget_min": 70, "budget_max": 80}, catalog.listings, top_n=100)) == [5, added.listing_id]
@@ -0,0 +1,81 @@
+import pytest
+
+import user_crud
+from result_cache import RecommendationCache, normalize_query, user_fingerprint
+from user_crud import User
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def key(user_id, top_n=5, version=1):
+    return (user_id, top_n, version)
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = RecommendationCache(maxsize=10, ttl=60, clock=clock)
+    cache.put(key("u1"), b"first")
+    clock.now = 60
+    assert cache.get(key("u1")) == b"first"
+    clock.now = 60.5
+    assert cache.get(key("u1")) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"], stats["users"]) == (1, 1, 1, 0, 0)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RecommendationCache(maxsize=2, ttl=60, clock=Clock())
+    cache.put(key("u1"), b"1")
+    cache.put(key("u2"), b"2")
+    assert cache.get(key("u1")) == b"1"  # u2 is now the oldest
+    cache.put(key("u3"), b"3")
+    assert cache.get(key("u2")) is None
+    assert cache.get(key("u1")) == b"1" and cache.get(key("u3")) == b"3"
+    assert cache.stats()["evictions"] == 1 and cache.stats()["users"] == 2
+
+
+def test_invalidate_user_drops_only_that_users_entries():
+    cache = RecommendationCache(maxsize=10, ttl=60, clock=Clock())
+    for top_n in (5, 10):
+        cache.put(key("u1", top_n), b"u1")
+    cache.put(key("u2"), b"u2")
+    cache.invalidate_user("u1")
+    assert cache.get(key("u1", 5)) is None and cache.get(key("u1", 10)) is None
+    assert cache.get(key("u2")) == b"u2"
+    assert cache.stats()["users"] == 1
+
+
+@pytest.fixture
+def hooked_cache(monkeypatch, tmp_path):
+    # Registered like web_server does; user files go to a temp folder
+    cache = RecommendationCache(maxsize=10, ttl=60, clock=Clock())
+    monkeypatch.setattr(user_crud, "USER_CHANGE_HOOKS", [cache.invalidate_user])
+    save = user_crud.save_users
+    monkeypatch.setattr(user_crud, "save_users", lambda users: save(users, filename=str(tmp_path / "users.json")))
+    return cache
+
+
+def test_profile_update_and_delete_invalidate_through_the_hooks(hooked_cache):
+    users = [User("Ann", 2, "lake", 50, 150, user_id="u1"), User("Bob", 1, "city", 80, 200, user_id="u2")]
+    for user in users:
+        hooked_cache.put(key(user.user_id) + user_fingerprint(user), b"cached")
+
+    # A name change leaves recommendations alone
+    user_crud.update_user(users, "u1", name="Annie")
+    assert hooked_cache.stats()["size"] == 2
+    user_crud.update_user(users, "u1", budget_max=300)
+    assert hooked_cache.stats()["size"] == 1
+    user_crud.delete_user(users, "u2")
+    assert hooked_cache.stats()["size"] == 0
+
+
+def test_equivalent_queries_share_a_key():
+    assert normalize_query("Lake city", 100, "200", amenities=["Wifi ", "pool"]) == \
+        normalize_query("city lake", 100.0, 200, amenities=["pool", "wifi"])
+    assert normalize_query("lake", 100) != normalize_query("lake", 101)
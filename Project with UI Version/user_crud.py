@@ -50,6 +50,15 @@ class User:
 
 USERS_FILE = USERS_DATA_FILE
 
+# Called with a user_id whenever that user's recommendation inputs change or the user is deleted
+# (the web server registers its recommendation cache here).
+USER_CHANGE_HOOKS = []
+
+
+def notify_user_changed(user_id):
+    for hook in USER_CHANGE_HOOKS:
+        hook(user_id)
+
 
 def save_users(users: List[User], filename=USERS_FILE):
 
@@ -160,6 +169,8 @@ def update_user(
         user.budget_max = budget_max
 
     save_users(users)
+    if any(v is not None for v in (group_size, preferred_environment, budget_min, budget_max)):
+        notify_user_changed(user_id)
     return True
 
 
@@ -171,6 +182,7 @@ def delete_user(users: List[User], user_id: str) -> bool:
         if user.user_id == user_id:
             users.pop(i)
             save_users(users)
+            notify_user_changed(user_id)
             return True
     return False
 
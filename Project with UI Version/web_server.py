@@ -3,7 +3,7 @@ from __future__ import annotations
 from flask import Flask, request, jsonify, render_template, send_file
 from pathlib import Path
 from configs import CLEANED_LISTING_CSV_PATH, LLM_API_KEY
-import io, csv, datetime, random, math
+import io, csv, datetime, random, math, heapq, itertools
 import json, uuid # Ensure json and uuid are imported for the new endpoint
 from flask import request, jsonify
 from pathlib import Path
@@ -24,8 +24,11 @@ except ImportError:
     LLM_AVAILABLE = False
 
 try:
-    from user_crud import load_users, create_user, find_user_by_id, save_users
+    from user_crud import load_users, create_user, find_user_by_id, save_users, USER_CHANGE_HOOKS, notify_user_changed
 except Exception:
+    USER_CHANGE_HOOKS = []
+    def notify_user_changed(user_id):
+        for hook in USER_CHANGE_HOOKS: hook(user_id)
     # Fallback to project-relative data/users.json if the absolute path does not exist
     try:
         BASE_DIR = Path(__file__).resolve().parent
@@ -60,11 +63,23 @@ except Exception:
 # optional recommender
 try:
     from recommender import get_recommendations as _recommend_fn  # expects (listings, user, k) -> list
+    from recommender import recommend_batch as _recommend_batch_fn
 except Exception:
-    _recommend_fn = None
+    _recommend_fn = _recommend_batch_fn = None
 
+# optional near-duplicate filter for synthetic merges
 try:
-    from listings import load_listings, filter_combined, sort_listings, find_listing_by_id
+    from dedup import drop_near_duplicates
+except Exception:
+    drop_near_duplicates = None
+
+try:
+    from listings import (load_listings, filter_combined, sort_listings, find_listing_by_id,
+                          filter_planned, listings_from_records, suggest, search_listings,
+                          rank_by_relevance, facets, Listings_File)
+    from listing_store import LISTING_FIELDS, normalize_listing_id
+    from listing_catalog import ListingCatalog
+    from result_cache import ResultCache, RecommendationCache, normalize_query, user_fingerprint
 except Exception:
     import pandas as pd
     def _first_existing(paths):
@@ -106,6 +121,22 @@ except Exception:
                 if str(r.get("listing_id")) == str(listing_id): return r
             except: pass
         return None
+    filter_planned = ResultCache = normalize_query = search_listings = rank_by_relevance = facets = None
+    RecommendationCache = user_fingerprint = None
+    ListingCatalog = Listings_File = None
+    LISTING_FIELDS = ()
+    def suggest(listings, prefix, limit=10, fields=None):
+        from collections import Counter
+        prefix = (prefix or "").strip().lower()
+        counts = Counter()
+        for r in listings:
+            for f in fields or ("location", "property_type", "name"):
+                v = str(r.get(f) or "")
+                if prefix and v.lower().startswith(prefix): counts[(f, v)] += 1
+        ranked = sorted(counts.items(), key=lambda t: (-t[1], t[0][1].lower()))[:limit]
+        return [{"field": f, "value": v, "count": n} for (f, v), n in ranked]
+    def listings_from_records(rows): return list(rows)
+    def normalize_listing_id(v): return str(v).strip()
 
 try:
     from favourites import get_user_favorites, add_favorite, remove_favorite
@@ -313,11 +344,11 @@ def filter_safe(listings, environment, min_price, max_price, accommodates):
             try: return filter_combined(listings, environment, min_price, max_price, accommodates)
             except: pass
     except: pass
-    env = (environment or "").strip().lower()
+    env_tokens = set(re.findall(r"[^\W_]+", (environment or "").lower()))
     def ok(r):
-        if env:
+        if env_tokens:
             hay = " ".join(str(x) for x in [_get(r,"tags",""), _get(r,"preferred_environment",""), _get(r,"name",""), _get(r,"property_type","")]).lower()
-            if env not in hay: return False
+            if not env_tokens <= set(re.findall(r"[^\W_]+", hay)): return False
         p = _to_float(_get(r,"price"))
         if min_price is not None and (p is None or p < float(min_price)): return False
         if max_price is not None and (p is None or p > float(max_price)): return False
@@ -346,24 +377,82 @@ def _fallback_recommend(user, listings, k=12):
         if price:  score += max(0, (bmax - price) / max(1.0, bmax-bmin or 1.0))
         score += 0.2 * min(acc or 0, gsize)
         recs.append((score, r))
-    recs.sort(key=lambda t: t[0], reverse=True)
-    return [json_sanitize(as_dict(x)) for _, x in recs[:k]]
+    # Bounded heap: same result as a stable sort by score, without sorting every listing
+    best = heapq.nlargest(k, recs, key=lambda t: t[0])
+    return [json_sanitize(as_dict(x)) for _, x in best]
 
 # app + dataset state 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 USERS = load_users() or []
-ORIGINAL_LISTINGS = load_listings() or []
+ORIGINAL_LISTINGS = load_listings()
 LISTINGS = ORIGINAL_LISTINGS
 ACTIVE_SOURCE = "original"
 SYNTHETIC_LIST = []
 
+LISTING_INDEX = {}  # normalized listing_id -> dataset (original or active) holding it
+DATASET_VERSION = 0  # bumped whenever the active listings change; part of result cache keys
+RESULT_CACHE = ResultCache(maxsize=256) if ResultCache else None
+# Serialized /api/recommend responses per user; profile edits drop that user's entries
+RECOMMENDATION_CACHE = RecommendationCache(maxsize=1024, ttl=300.0) if RecommendationCache else None
+if RECOMMENDATION_CACHE is not None: USER_CHANGE_HOOKS.append(RECOMMENDATION_CACHE.invalidate_user)
+
+def _rebuild_listing_index():
+    """Hash index over both datasets; rebuilt whenever the active set switches."""
+    global LISTING_INDEX
+    index = {}
+    for dataset in (ORIGINAL_LISTINGS, LISTINGS):  # active set wins on id collisions
+        store = getattr(dataset, "store", None)
+        if store is not None:
+            index.update(dict.fromkeys(store.id_index, dataset))
+        else:
+            index.update((normalize_listing_id(_get(r, "listing_id")), dataset) for r in dataset)
+    LISTING_INDEX = index
+
+def listings_changed(rebuild_index=True):
+    """Call after the active dataset switches or its listings are edited."""
+    global DATASET_VERSION
+    DATASET_VERSION += 1
+    if RESULT_CACHE is not None: RESULT_CACHE.clear()
+    if RECOMMENDATION_CACHE is not None: RECOMMENDATION_CACHE.clear()
+    if rebuild_index: _rebuild_listing_index()
+
 def get_active_listings(): return LISTINGS
 def set_original_active():
     global LISTINGS, ACTIVE_SOURCE
     LISTINGS = ORIGINAL_LISTINGS; ACTIVE_SOURCE = "original"
+    listings_changed()
 def set_synthetic_active(rows):
-    global LISTINGS, ACTIVE_SOURCE, SYNTHETIC_LIST
-    SYNTHETIC_LIST = list(rows); LISTINGS = SYNTHETIC_LIST; ACTIVE_SOURCE = "synthetic"
+    global LISTINGS, ACTIVE_SOURCE, SYNTHETIC_LIST, SYNTHETIC_CATALOG
+    SYNTHETIC_LIST = listings_from_records(rows); LISTINGS = SYNTHETIC_LIST; ACTIVE_SOURCE = "synthetic"
+    # Synthetic edits are kept in memory only
+    SYNTHETIC_CATALOG = ListingCatalog(SYNTHETIC_LIST) if ListingCatalog and hasattr(SYNTHETIC_LIST, "store") else None
+    listings_changed()
+
+# Listing edits: the original dataset logs them next to its CSV (see listing_catalog.py)
+ORIGINAL_CATALOG = None
+if ListingCatalog and hasattr(ORIGINAL_LISTINGS, "store"):
+    ORIGINAL_CATALOG = ListingCatalog(ORIGINAL_LISTINGS, csv_path=Listings_File if Path(Listings_File).exists() else None)
+SYNTHETIC_CATALOG = None
+
+def _active_catalog(): return ORIGINAL_CATALOG if ACTIVE_SOURCE == "original" else SYNTHETIC_CATALOG
+
+def _catalog_changed(catalog, listing_id, removed=False):
+    """Publish the catalog's new view and patch the id index instead of rebuilding it."""
+    global LISTINGS, ORIGINAL_LISTINGS, SYNTHETIC_LIST
+    view = catalog.listings
+    if catalog is ORIGINAL_CATALOG: ORIGINAL_LISTINGS = view
+    else: SYNTHETIC_LIST = view
+    LISTINGS = view
+    key = normalize_listing_id(listing_id)
+    if not removed:
+        LISTING_INDEX[key] = view
+    elif ACTIVE_SOURCE != "original" and key in ORIGINAL_LISTINGS.store.id_index:
+        LISTING_INDEX[key] = ORIGINAL_LISTINGS
+    else:
+        LISTING_INDEX.pop(key, None)
+    listings_changed(rebuild_index=False)
+
+_rebuild_listing_index()
 
 # pages 
 @app.route("/")
@@ -409,6 +498,7 @@ def api_user_update(user_id):
         return jsonify({"error": "User not found"}), 404
     
     data = request.get_json(force=True)
+    before = user_fingerprint(user_to_update) if user_fingerprint else None
     
     user_to_update.name = data.get("name", user_to_update.name)
     user_to_update.group_size = int(data.get("group_size", user_to_update.group_size))
@@ -418,19 +508,55 @@ def api_user_update(user_id):
     
     # This function correctly handles saving a list of User objects
     save_users(USERS)
+    if user_fingerprint and user_fingerprint(user_to_update) != before:
+        notify_user_changed(user_to_update.user_id)
     
     # as_dict will correctly convert the updated object to a dictionary for the JSON response
     return jsonify(json_sanitize(as_dict(user_to_update)))
 
 
 # listings
+def _filter_args():
+    """Filters shared by /api/listings and /api/facets, or an error message."""
+    args = {
+        "environment": request.args.get("environment", "").lower().strip(),
+        "min_price": request.args.get("min_price", type=float),
+        "max_price": request.args.get("max_price", type=float),
+        "accommodates": request.args.get("accommodates", type=int),
+        "amenities": [a.strip() for a in request.args.get("amenities", "").split(",") if a.strip()],  # must-haves
+        "fuzzy": request.args.get("fuzzy", "").lower() in ("1", "true"),  # typo-tolerant environment matching
+    }
+    # Optional geo filters: lat/lon/radius_km and/or bbox=south,west,north,east
+    lat, lon = request.args.get("lat", type=float), request.args.get("lon", type=float)
+    radius_km = request.args.get("radius_km", type=float)
+    args["near"] = (lat, lon, radius_km) if None not in (lat, lon, radius_km) else None
+    args["bbox"] = None
+    if request.args.get("bbox"):
+        try:
+            args["bbox"] = tuple(float(x) for x in request.args["bbox"].split(","))
+        except ValueError:
+            args["bbox"] = ()
+        if len(args["bbox"]) != 4:
+            return None, "bbox must be south,west,north,east"
+    return args, None
+
+def _planned(args):
+    """(filtered view, plan) for the filter args, unsorted."""
+    return filter_planned(
+        get_active_listings(), environment=args["environment"], fields=("tags", "name", "location"),
+        min_price=args["min_price"], max_price=args["max_price"], min_accommodates=args["accommodates"],
+        amenities=args["amenities"], fuzzy=args["fuzzy"], near=args["near"], bbox=args["bbox"],
+    )
+
 @app.route("/api/listings", methods=["GET"])
 def api_listings():
     # Get filter parameters from the request
-    env_keyword = request.args.get("environment", "").lower().strip()
-    min_price = request.args.get("min_price", type=float)
-    max_price = request.args.get("max_price", type=float)
-    accommodates = request.args.get("accommodates", type=int)
+    args, error = _filter_args()
+    if error: return jsonify({"error": error}), 400
+    env_keyword, min_price, max_price = args["environment"], args["min_price"], args["max_price"]
+    accommodates, amenities, fuzzy = args["accommodates"], args["amenities"], args["fuzzy"]
+    near, bbox = args["near"], args["bbox"]
+    query = request.args.get("q", "").strip() or env_keyword  # text scored by sort_by=relevance
     
     # Get sorting and pagination parameters
     sort_by = request.args.get("sort_by", default="price")
@@ -438,51 +564,151 @@ def api_listings():
     limit = request.args.get("limit", type=int, default=12)
     page = request.args.get("page", type=int, default=1)
     
-    # get_active_listings() now returns a list of Listing OBJECTS
-    base_listings = get_active_listings() or []
-    
-    filtered_listings = list(base_listings)
-
-    # Apply filters using object attribute access
-    if env_keyword:
-        filtered_listings = [
-            l for l in filtered_listings 
-            if env_keyword in str(getattr(l, 'tags', '')).lower() or 
-               env_keyword in str(getattr(l, 'name', '')).lower() or
-               env_keyword in str(getattr(l, 'location', '')).lower()
-        ]
-
-    if min_price is not None:
-        filtered_listings = [l for l in filtered_listings if float(getattr(l, 'price', 0)) >= min_price]
-
-    if max_price is not None:
-        filtered_listings = [l for l in filtered_listings if float(getattr(l, 'price', 0)) <= max_price]
-
-    if accommodates is not None:
-        filtered_listings = [l for l in filtered_listings if int(getattr(l, 'accommodates', 0)) >= accommodates]
-        
-    # Apply sorting using object attribute access 
-    if sort_by:
-        try:
-            filtered_listings.sort(key=lambda l: getattr(l, sort_by, 0) or 0, reverse=not ascending)
-        except TypeError:
-            filtered_listings.sort(key=lambda l: str(getattr(l, sort_by, '')), reverse=not ascending)
-
-    # Apply pagination
+    # get_active_listings() returns a columnar ListingView; filters are masks
+    filtered_listings = get_active_listings()
+
+    plan = None
+    if filter_planned is None:
+        filtered_listings = filter_safe(list(filtered_listings), env_keyword, min_price, max_price, accommodates)
+        filtered_listings = sort_safe(filtered_listings, sort_by, ascending) if sort_by else filtered_listings
+    else:
+        # Every page of a query shares one cached, ordered result
+        cache_key = (DATASET_VERSION,) + normalize_query(env_keyword, min_price, max_price, accommodates,
+                                                        amenities, sort_by, ascending, fuzzy,
+                                                        query if sort_by == "relevance" else None,
+                                                        near, bbox)
+        cached = RESULT_CACHE.get(cache_key)
+        if cached is not None:
+            filtered_listings, plan = cached
+        else:
+            # Planner orders the predicates by selectivity and evaluates them in one pass
+            filtered_listings, plan = _planned(args)
+            if sort_by == "similarity" and plan.similarity is not None:
+                filtered_listings = filtered_listings.rank(*plan.similarity)
+            elif sort_by == "relevance":
+                filtered_listings = rank_by_relevance(filtered_listings, query)
+            # Stable argsort over the column; unknown keys leave the order as is
+            elif sort_by:
+                filtered_listings = filtered_listings.order_by(sort_by, ascending=ascending)
+            RESULT_CACHE.put(cache_key, (filtered_listings, plan))
+
+    # Apply pagination; Listing objects are only built for this page
     total = len(filtered_listings)
     start = max(0, (page - 1) * limit)
     end = start + limit
     paginated_items_objects = filtered_listings[start:end]
     
     # Convert the final list of objects back to dictionaries for the JSON response
-    items_as_dicts = [item.to_dict() for item in paginated_items_objects]
+    items_as_dicts = [as_dict(item) for item in paginated_items_objects]
     
-    return jsonify({
+    response = {
         "total": total, 
         "page": page, 
         "limit": limit, 
         "items": json_sanitize(items_as_dicts)
-    })
+    }
+    if plan is not None and request.args.get("explain") == "1":
+        response["plan"] = plan.explain()
+    return jsonify(response)
+
+@app.route("/api/facets", methods=["GET"])
+def api_facets():
+    # Same filters as /api/listings; counts come from bincounts over the encoded columns
+    if facets is None: return jsonify({"error": "Facets are not available"}), 503
+    args, error = _filter_args()
+    if error: return jsonify({"error": error}), 400
+    top = max(1, min(request.args.get("top", type=int, default=10), 100))
+    # Cached next to the listing results (same dataset version, same invalidation)
+    key = ("facets", top, DATASET_VERSION) + normalize_query(
+        args["environment"], args["min_price"], args["max_price"], args["accommodates"], args["amenities"],
+        fuzzy=args["fuzzy"], near=args["near"], bbox=args["bbox"])
+    counts = RESULT_CACHE.get(key)
+    if counts is None:
+        counts = facets(_planned(args)[0], top=top)
+        RESULT_CACHE.put(key, counts)
+    return jsonify(counts)
+
+@app.route("/api/search", methods=["GET"])
+def api_search():
+    q = request.args.get("q", "").strip()
+    limit = request.args.get("limit", type=int, default=12)
+    page = request.args.get("page", type=int, default=1)
+    if search_listings is None:
+        return jsonify({"error": "Ranked search is not available"}), 503
+    ranked, scores = search_listings(get_active_listings(), q)
+    start = max(0, (page - 1) * limit)
+    items = []
+    for item, score in zip(ranked[start:start + limit], scores[start:start + limit].tolist()):
+        d = json_sanitize(as_dict(item)); d["score"] = round(score, 4)
+        items.append(d)
+    return jsonify({"query": q, "total": len(ranked), "page": page, "limit": limit, "items": items})
+
+@app.route("/api/suggest", methods=["GET"])
+def api_suggest():
+    # Called on every keystroke; the prefix index answers with two binary searches per field
+    q = request.args.get("q", "")
+    limit = max(1, min(request.args.get("limit", type=int, default=10), 50))
+    field = request.args.get("field")
+    fields = (field,) if field in ("location", "property_type", "name") else None
+    return jsonify({"query": q, "suggestions": suggest(get_active_listings(), q, limit=limit, fields=fields)})
+
+@app.route("/api/cache/stats", methods=["GET"])
+def api_cache_stats():
+    if RESULT_CACHE is None: return jsonify({"enabled": False})
+    return jsonify({"enabled": True, "dataset_version": DATASET_VERSION, **RESULT_CACHE.stats(),
+                    "recommendations": RECOMMENDATION_CACHE.stats()})
+
+@app.route("/api/stats", methods=["GET"])
+def api_stats():
+    store = getattr(get_active_listings(), "store", None)
+    if store is None: return jsonify({"enabled": False})
+    top = max(1, min(request.args.get("top", type=int, default=10), 100))
+    return jsonify({"enabled": True, "source": ACTIVE_SOURCE, "dataset_version": DATASET_VERSION,
+                    **store.stats.to_dict(top=top)})
+
+def _listing_payload():
+    """Known listing fields from the request body, or an error message."""
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return None, "JSON object required"
+    fields = {k: v for k, v in data.items() if k in LISTING_FIELDS}
+    for key in ("price", "review_rating", "latitude", "longitude"):
+        if fields.get(key) not in (None, "") and _to_float(fields[key]) is None:
+            return None, f"{key} must be a number"
+    for key in ("accommodates", "min_nights", "max_nights"):
+        if fields.get(key) not in (None, "") and _to_int(fields[key]) is None:
+            return None, f"{key} must be an integer"
+    return fields, None
+
+@app.route("/api/listings", methods=["POST"])
+def api_listing_create():
+    catalog = _active_catalog()
+    if catalog is None: return jsonify({"error": "Listing edits are not available"}), 503
+    fields, error = _listing_payload()
+    if error: return jsonify({"error": error}), 400
+    listing = catalog.add(fields)
+    if listing is None: return jsonify({"error": "listing_id already exists"}), 409
+    _catalog_changed(catalog, listing.listing_id)
+    return jsonify(json_sanitize(as_dict(listing))), 201
+
+@app.route("/api/listings/<listing_id>", methods=["PUT"])
+def api_listing_update(listing_id):
+    catalog = _active_catalog()
+    if catalog is None: return jsonify({"error": "Listing edits are not available"}), 503
+    fields, error = _listing_payload()
+    if error: return jsonify({"error": error}), 400
+    listing = catalog.update(listing_id, fields)
+    if listing is None: return jsonify({"error": "Listing not found"}), 404
+    _catalog_changed(catalog, listing.listing_id)
+    return jsonify(json_sanitize(as_dict(listing)))
+
+@app.route("/api/listings/<listing_id>", methods=["DELETE"])
+def api_listing_delete(listing_id):
+    catalog = _active_catalog()
+    if catalog is None: return jsonify({"error": "Listing edits are not available"}), 503
+    if not catalog.delete(listing_id): return jsonify({"error": "Listing not found"}), 404
+    _catalog_changed(catalog, listing_id, removed=True)
+    return jsonify({"ok": True, "listing_id": listing_id})
 
 @app.route("/api/listings/<listing_id>", methods=["GET"])
 def api_listing_get(listing_id):
@@ -503,17 +729,35 @@ def api_recommend():
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    if not _recommend_fn:
-        return jsonify({"error": "Recommender module is not available"}), 500
-
-    # Convert user object and listing objects to simple dictionaries
+    # The recommender works on the columnar view directly; the user is passed as a plain dictionary
     user_dict = as_dict(user)
-    listings_list_of_dicts = [as_dict(l) for l in get_active_listings() or []]
+    active = get_active_listings()
+    lat, lon = request.args.get("lat", type=float), request.args.get("lon", type=float)
+    radius_km = request.args.get("radius_km", type=float)
+    near = (lat, lon, radius_km) if None not in (lat, lon, radius_km) else None
+
+    # Repeat requests are answered with the JSON serialized the first time
+    cache_key = None
+    if RECOMMENDATION_CACHE is not None:
+        cache_key = (str(user_dict.get("user_id", user_id)), k, DATASET_VERSION, user_fingerprint(user_dict), near)
+        body = RECOMMENDATION_CACHE.get(cache_key)
+        if body is not None:
+            return app.response_class(body, mimetype=app.json.mimetype)
+
+    if not hasattr(active, "store"):
+        active = [as_dict(l) for l in active or []]
 
     try:
-        # Call the recommender with dictionaries
-        recommendations = _recommend_fn(user_dict, listings_list_of_dicts, top_n=k)
-        return jsonify({"total": len(listings_list_of_dicts), "items": json_sanitize(recommendations)})
+        # Listing features are prepared once per dataset version inside the recommender
+        if _recommend_fn:
+            recommendations = _recommend_fn(user_dict, active, top_n=k, near=near, version=DATASET_VERSION)
+        else:
+            # Recommender module unavailable: simple scoring over the same listings
+            recommendations = _fallback_recommend(user_dict, active, k=k)
+        response = jsonify({"total": len(active), "items": json_sanitize(recommendations)})
+        if cache_key is not None:
+            RECOMMENDATION_CACHE.put(cache_key, response.get_data())
+        return response
     except Exception as e:
         print(f"--- RECOMMENDATION API ERROR ---")
         print(f"Error: {e}")
@@ -521,6 +765,34 @@ def api_recommend():
         print(f"-----------------------------")
         return jsonify({"error": "An internal error occurred while generating recommendations."}), 500
 
+@app.route("/api/recommend/batch", methods=["POST"])
+def api_recommend_batch():
+    # Body: {"user_ids": [...], "limit": 5}; no user_ids means every profile
+    if not _recommend_batch_fn:
+        return jsonify({"error": "Recommender module is not available"}), 500
+    data = request.get_json(force=True, silent=True) or {}
+    k = max(1, min(_to_int(data.get("limit"), 5), 100))
+    ids = data.get("user_ids")
+    if ids is not None and not isinstance(ids, list):
+        return jsonify({"error": "user_ids must be a list"}), 400
+    users = list(USERS) if ids is None else [find_user_by_id(USERS, str(i)) for i in ids]
+    missing = [str(i) for i, u in zip(ids or [], users) if u is None]
+    users = [u for u in users if u is not None]
+
+    active = get_active_listings()
+    if not hasattr(active, "store"):
+        active = [as_dict(l) for l in active or []]
+    try:
+        results = _recommend_batch_fn([as_dict(u) for u in users], active, top_n=k, version=DATASET_VERSION)
+    except Exception:
+        traceback.print_exc()
+        return jsonify({"error": "An internal error occurred while generating recommendations."}), 500
+    return jsonify({
+        "limit": k,
+        "results": {u.user_id: json_sanitize(recs) for u, recs in zip(users, results)},
+        "missing": missing,
+    })
+
 @app.route("/api/favorites/<user_id>", methods=["GET"])
 def api_favorites_list(user_id):
     fav_ids = {str(fid) for fid in get_user_favorites(user_id)}
@@ -546,15 +818,8 @@ def api_favorites_remove():
     
 
 def _listing_exists_anywhere(listing_id):
-    lid = str(listing_id)
-    # check both original and synthetic (active) sets
-    for r in list(rows_as_dicts(ORIGINAL_LISTINGS)) + list(rows_as_dicts(LISTINGS)):
-        try:
-            if str(as_dict(r).get("listing_id")) == lid:
-                return True
-        except Exception:
-            pass
-    return False
+    # O(1): the index covers both the original and the synthetic (active) sets
+    return normalize_listing_id(listing_id) in LISTING_INDEX
 
 @app.route("/api/availability", methods=["GET"])
 def api_availability():
@@ -661,21 +926,41 @@ def api_dataset_use_original():
     return jsonify({"ok": True, "source": ACTIVE_SOURCE, "count": len(LISTINGS)})
 
 def _build_synthetic_rows(include_real: bool, n_fake: int):
-    original_dicts = list(rows_as_dicts(ORIGINAL_LISTINGS))
-    prices = [_to_float(r.get("price")) for r in original_dicts]; prices = [p for p in prices if p is not None] or [150.0]
-    mean_price, min_p, max_p = sum(prices)/len(prices), min(prices), max(prices)
-    ratings = [_to_float(r.get("review_rating")) for r in original_dicts]; ratings = [x for x in ratings if x is not None] or [4.6]
-    mean_rating = sum(ratings)/len(ratings)
-
-    property_types = [r.get("property_type") or r.get("type") for r in original_dicts if (r.get("property_type") or r.get("type"))] or ["apartment"]
-    locations = [r.get("location") for r in original_dicts if r.get("location")] or ["Nowhere, XX"]
-
-    ams = []
-    for r in original_dicts:
-        am = r.get("amenities")
-        if isinstance(am, list): ams.extend(am)
-        elif isinstance(am, str): ams.extend([p.strip() for p in am.split(",") if p.strip()])
-    amenity_pool = sorted({a for a in ams if a}) or ["Wifi","Kitchen","Free parking","Air conditioning","Washer"]
+    store = getattr(ORIGINAL_LISTINGS, "store", None)
+    if store is not None:
+        # Maintained column statistics instead of a pass over every listing
+        stats = store.stats
+        price, rating = stats.numeric["price"], stats.numeric["review_rating"]
+        mean_price, min_p, max_p = (price.mean, price.min, price.max) if price.count else (150.0, 150.0, 150.0)
+        mean_rating = rating.mean if rating.count else 4.6
+        # (value, listings using it) pairs: picks are weighted like choosing from the full column
+        property_types = stats.text["property_type"].items() or [("apartment", 1)]
+        locations = stats.text["location"].items() or [("Nowhere, XX", 1)]
+        amenity_pool = sorted(a for a, _ in stats.lists["amenities"].items() if a) or ["Wifi","Kitchen","Free parking","Air conditioning","Washer"]
+    else:
+        # One pass over the rows, converting each to a dict only while it is read
+        prices, ratings, property_types, locations, ams = [], [], [], [], set()
+        for r in rows_as_dicts(ORIGINAL_LISTINGS):
+            p = _to_float(r.get("price"))
+            if p is not None: prices.append(p)
+            x = _to_float(r.get("review_rating"))
+            if x is not None: ratings.append(x)
+            pt = r.get("property_type") or r.get("type")
+            if pt: property_types.append((pt, 1))
+            if r.get("location"): locations.append((r.get("location"), 1))
+            am = r.get("amenities")
+            if isinstance(am, list): ams.update(am)
+            elif isinstance(am, str): ams.update(p.strip() for p in am.split(","))
+        prices, ratings = prices or [150.0], ratings or [4.6]
+        mean_price, min_p, max_p = sum(prices)/len(prices), min(prices), max(prices)
+        mean_rating = sum(ratings)/len(ratings)
+        property_types = property_types or [("apartment", 1)]
+        locations = locations or [("Nowhere, XX", 1)]
+        amenity_pool = sorted(a for a in ams if a) or ["Wifi","Kitchen","Free parking","Air conditioning","Washer"]
+
+    def pick(pairs):
+        values, weights = zip(*pairs)
+        return random.choices(values, weights=weights)[0]
 
     def synth_row(i):
         price = max(min_p, min(max_p, mean_price*(0.6 + random.random())))
@@ -684,8 +969,8 @@ def _build_synthetic_rows(include_real: bool, n_fake: int):
         return {
             "listing_id": f"SYN-{i}",
             "name": f"Synthetic Stay #{i}",
-            "location": random.choice(locations),
-            "property_type": random.choice(property_types),
+            "location": pick(locations),
+            "property_type": pick(property_types),
             "accommodates": random.randint(1,10),
             "price": round(price,2),
             "review_rating": round(rating,2),
@@ -693,7 +978,8 @@ def _build_synthetic_rows(include_real: bool, n_fake: int):
         }
 
     syn = [synth_row(i+1) for i in range(n_fake)]
-    return (original_dicts + syn) if include_real else syn
+    # Real rows are converted as the caller writes them out, never held as a second copy
+    return itertools.chain(rows_as_dicts(ORIGINAL_LISTINGS), syn) if include_real else syn
 
 # API endpoint for LLM-based data generation.
 @app.route("/api/dataset/use_synthetic", methods=["POST"])
@@ -735,12 +1021,17 @@ def api_dataset_use_synthetic():
 
    # Merge datasets by ensuring all data are dictionaries first.
         # Convert ORIGINAL_LISTINGS (which are objects) to a list of dictionaries.
-        original_dicts = [as_dict(l) for l in ORIGINAL_LISTINGS]
-        
         if include_real:
+            original_dicts = [as_dict(l) for l in ORIGINAL_LISTINGS]
             merged_list = original_dicts + synthetic_dicts
         else:
-            merged_list = synthetic_dicts
+            original_dicts, merged_list = [], synthetic_dicts
+
+        # LLM output repeats itself; drop synthetic near-copies, never the real listings
+        duplicates = []
+        if drop_near_duplicates:
+            merged_list, duplicates = drop_near_duplicates(
+                merged_list, protected=len(original_dicts))
 
         # Update the active dataset, re-indexing to ensure unique IDs.
         # This loop now safely operates on a list containing ONLY dictionaries.
@@ -749,7 +1040,8 @@ def api_dataset_use_synthetic():
         
         set_synthetic_active(merged_list)
 
-        return jsonify({"ok": True, "source": ACTIVE_SOURCE, "count": len(LISTINGS)})
+        return jsonify({"ok": True, "source": ACTIVE_SOURCE, "count": len(LISTINGS),
+                        "duplicates_dropped": len(duplicates)})
 
     except Exception as e:
         print("ERROR during LLM generation or processing:")
@@ -763,14 +1055,14 @@ def api_synthetic_csv():
     include_real = bool(d.get("include_real", True))
     n_fake = max(0, min(int(d.get("fake_rows", 100)), 5000))
 
-    original_dicts = list(rows_as_dicts(ORIGINAL_LISTINGS))
     generated = _build_synthetic_rows(include_real, n_fake)
 
     preferred = ["listing_id","name","location","property_type","accommodates","price","review_rating","amenities","tags"]
     keys, seen = list(preferred), set(preferred)
-    for r in original_dicts:
-        for k in r.keys():
-            if k not in seen: keys.append(k); seen.add(k)
+    # Columnar listings all carry LISTING_FIELDS; only a plain list needs its keys collected
+    extra = LISTING_FIELDS if hasattr(ORIGINAL_LISTINGS, "store") else (k for r in rows_as_dicts(ORIGINAL_LISTINGS) for k in r)
+    for k in extra:
+        if k not in seen: keys.append(k); seen.add(k)
 
     buf = io.StringIO()
     w = csv.DictWriter(buf, fieldnames=keys, extrasaction="ignore")